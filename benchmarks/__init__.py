@@ -0,0 +1,4 @@
+"""
+OpenClaw Voice - Benchmarks
+Offline load tests with stand-ins for Discord, yt-dlp and TTS engines
+"""
@@ -0,0 +1,82 @@
+"""
+OpenClaw Voice - Playback Checks
+Replay failure cases through the real player, against fake guilds and stub backends
+
+    python -m benchmarks.checks
+
+Each check prints PASS or FAIL; the exit status is 1 if any failed.
+"""
+import asyncio
+import logging
+import sys
+
+from openclaw_voice import player, resolver
+
+from .fakes import DeadStreamSource, FakeBot, FakeGuild, FakeVoiceChannel, StubExtractorPool, ToneSource
+
+# How long a check waits for playback to get where it should (seconds)
+CHECK_TIMEOUT = 5
+
+
+async def wait_for(events, name):
+    """Wait until an event named name has been recorded"""
+    async def seen():
+        while name not in events:
+            await asyncio.sleep(0.01)
+    try:
+        await asyncio.wait_for(seen(), CHECK_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise AssertionError(f"no {name} event: {events}") from None
+
+
+async def dead_cached_url(guild_id, broadcast=False):
+    """A cached stream URL that has expired is re-resolved and queued again"""
+    url = f'https://www.youtube.com/watch?v=check{guild_id}'
+    pool = resolver._pool = StubExtractorPool()
+    sources = iter([DeadStreamSource()])
+    player._stream_source = lambda info: next(sources, None) or ToneSource(1)
+
+    bot = FakeBot()
+    guild = FakeGuild(guild_id)
+    channel = FakeVoiceChannel(guild_id + 1, guild)
+    bot.add_guild(guild)
+
+    await resolver.resolve(url, guild_id)  # Cached, e.g. by an earlier /play
+    events = []
+    await player.enqueue_url(
+        channel, url, guild_id, broadcast=broadcast, on_event=lambda event, **data: events.append(event)
+    )
+    await wait_for(events, 'first_audio')
+    assert 'retrying' in events, f"not retried: {events}"
+    assert pool.jobs == 2, f"{pool.jobs} extractor jobs, expected 2"
+    player.clear(guild_id)
+    await player.disconnect(guild_id)
+
+
+async def dead_broadcast_url(guild_id):
+    """The same, for a URL played as a broadcast (its ffmpeg is gone before the listener ends)"""
+    await dead_cached_url(guild_id, broadcast=True)
+
+
+CHECKS = [dead_cached_url, dead_broadcast_url]
+
+
+async def run_checks():
+    failed = 0
+    for n, check in enumerate(CHECKS):
+        try:
+            await check(5000 + n * 10)
+            print(f"PASS {check.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"FAIL {check.__name__}: {e!r}")
+    return failed
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    sys.exit(1 if asyncio.run(run_checks()) else 0)
+
+
+if __name__ == '__main__':
+    main()
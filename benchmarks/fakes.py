@@ -0,0 +1,296 @@
+"""
+OpenClaw Voice - Benchmark Stand-ins
+Fake Discord voice objects, a stub extractor pool and a stub TTS engine
+"""
+import asyncio
+import io
+import math
+import struct
+import threading
+import time
+import wave
+
+import discord
+
+from openclaw_voice import tts
+from openclaw_voice.sources import FRAME_SIZE, FRAME_SECONDS
+
+
+def tone_frame(frequency=440, volume=0.3):
+    """One 20 ms frame of a stereo sine tone, 48 kHz 16-bit PCM"""
+    samples = FRAME_SIZE // 4
+    out = bytearray()
+    for i in range(samples):
+        value = int(volume * 32767 * math.sin(2 * math.pi * frequency * i / 48000))
+        out += struct.pack('<hh', value, value)
+    return bytes(out)
+
+
+def tone_wav(seconds, frequency=440):
+    """A WAV file of a tone, the way a real engine hands back speech"""
+    frame = tone_frame(frequency)
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(48000)
+        f.writeframes(frame * max(1, int(seconds / FRAME_SECONDS)))
+    return out.getvalue()
+
+
+async def wav_to_pcm(data):
+    """Stand-in for tts.to_pcm without ffmpeg (only reads tone_wav output)"""
+    with wave.open(io.BytesIO(data)) as f:
+        return f.readframes(f.getnframes())
+
+
+class ToneSource(discord.AudioSource):
+    """A stream that plays a tone for a while, instead of ffmpeg reading a URL"""
+
+    def __init__(self, seconds):
+        self._frame = tone_frame(220)
+        self._frames = int(seconds / FRAME_SECONDS)
+
+    def read(self):
+        if self._frames <= 0:
+            return b''
+        self._frames -= 1
+        return self._frame
+
+    def is_opus(self):
+        return False
+
+
+class DeadStreamSource(discord.AudioSource):
+    """A stream whose ffmpeg exits with an error straight away, like one
+    reading a cached URL that has expired (403)
+
+    As with discord.py's FFmpegAudio, the exit code is only there until
+    cleanup() drops the process.
+    """
+
+    class _Process:
+        returncode = 1
+
+        def wait(self, timeout=None):
+            return self.returncode
+
+    def __init__(self):
+        self._process = self._Process()
+
+    def read(self):
+        return b''
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        self._process = None
+
+
+class FrameStats:
+    """Frames a fake voice client sent, and how often it missed the 20 ms deadline"""
+
+    def __init__(self):
+        self.frames = 0
+        self.opus_frames = 0
+        self.late_frames = 0
+        self.read_seconds = 0.0
+        self.first_frame = None
+        self._lock = threading.Lock()
+
+    def record(self, opus, elapsed, late):
+        with self._lock:
+            if self.first_frame is None:
+                self.first_frame = time.monotonic()
+            self.frames += 1
+            self.opus_frames += opus
+            self.late_frames += late
+            self.read_seconds += elapsed
+
+    def merge(self, other):
+        with other._lock:
+            self.frames += other.frames
+            self.opus_frames += other.opus_frames
+            self.late_frames += other.late_frames
+            self.read_seconds += other.read_seconds
+
+
+class FakeVoiceClient:
+    """Plays sources like discord.py's AudioPlayer, minus the network
+
+    One thread per playing source reads a frame every 20 ms. PCM frames
+    are Opus encoded when encode is set and libopus is loaded, so the CPU
+    numbers include what discord.py would spend.
+    """
+
+    def __init__(self, channel, encode=False):
+        self.channel = channel
+        self.guild = channel.guild
+        self.stats = FrameStats()
+        self._encoder = discord.opus.Encoder() if encode and discord.opus.is_loaded() else None
+        self._connected = True
+        self._source = None
+        self._thread = None
+        self._stop = None
+        self._paused = False
+
+    def is_connected(self):
+        return self._connected
+
+    def is_playing(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def is_paused(self):
+        return self._paused
+
+    def play(self, source, *, after=None):
+        if self.is_playing():
+            raise discord.ClientException('Already playing audio.')
+        self._source = source
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(source, self._stop, after), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, source, stop, after):
+        error = None
+        next_frame = time.perf_counter()
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                data = source.read()
+                elapsed = time.perf_counter() - start
+                if not data:
+                    break
+                opus = source.is_opus()
+                if not opus and self._encoder:
+                    self._encoder.encode(data, self._encoder.SAMPLES_PER_FRAME)
+                self.stats.record(opus, elapsed, start > next_frame + FRAME_SECONDS)
+                next_frame += FRAME_SECONDS
+                delay = next_frame - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame = time.perf_counter()  # Fell behind - don't burst to catch up
+        except Exception as e:
+            error = e
+        finally:
+            stop.set()
+            # Same order as discord.py's AudioPlayer
+            if after:
+                after(error)
+            source.cleanup()
+
+    def stop(self):
+        if self._stop:
+            self._stop.set()
+
+    def join(self):
+        """Wait for the play thread to exit (blocking)"""
+        if self._thread:
+            self._thread.join()
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+    async def disconnect(self, *, force=False):
+        self.stop()
+        self._connected = False
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = f'Guild {guild_id}'
+        self.voice_channels = []
+
+
+class FakeVoiceChannel:
+    """A voice channel whose connect() takes connect_latency seconds"""
+
+    def __init__(self, channel_id, guild, connect_latency=0.0, encode=False):
+        self.id = channel_id
+        self.name = f'voice-{channel_id}'
+        self.guild = guild
+        self.members = []
+        self.connect_latency = connect_latency
+        self.encode = encode
+        self.voice_clients = []  # Every client ever connected, for their frame stats
+        guild.voice_channels.append(self)
+
+    async def connect(self, **kwargs):
+        await asyncio.sleep(self.connect_latency)
+        vc = FakeVoiceClient(self, self.encode)
+        self.voice_clients.append(vc)
+        return vc
+
+    async def send(self, content):
+        pass
+
+
+class FakeBot:
+    """Just enough of discord.Client for the API"""
+
+    def __init__(self):
+        self.guilds = []
+        self._channels = {}
+
+    def add_guild(self, guild):
+        self.guilds.append(guild)
+        for channel in guild.voice_channels:
+            self._channels[channel.id] = channel
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+
+class StubExtractorPool:
+    """Answers resolve jobs after latency seconds, like a warm extractor pool
+
+    Resolved URLs point at stream_url (served by the benchmark itself for
+    --ffmpeg runs) and carry the video ID from the page URL.
+    """
+
+    def __init__(self, latency=0.0, stream_url='http://stub.invalid/audio', acodec='opus'):
+        self.latency = latency
+        self.stream_url = stream_url
+        self.acodec = acodec
+        self.jobs = 0
+
+    async def run(self, kind, target):
+        self.jobs += 1
+        await asyncio.sleep(self.latency)
+        if kind == 'search':
+            return []
+        video_id = target.rsplit('=', 1)[-1]
+        return {
+            'url': self.stream_url,
+            'id': video_id,
+            'title': f'Benchmark {video_id}',
+            'duration': None,
+            'acodec': self.acodec,
+            'webpage_url': target,
+            'extractor': 'youtube',
+        }
+
+
+class StubTTSEngine(tts.TTSEngine):
+    """Speech after latency seconds: a tone as long as the text would take to say"""
+
+    name = 'bench'
+
+    def __init__(self, latency=0.0, seconds_per_char=0.06):
+        self.latency = latency
+        self.seconds_per_char = seconds_per_char
+
+    async def synthesize(self, text, lang, voice=None):
+        await asyncio.sleep(self.latency)
+        return tone_wav(len(text) * self.seconds_per_char, frequency=660)
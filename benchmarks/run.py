@@ -0,0 +1,339 @@
+"""
+OpenClaw Voice - Benchmark
+Load-test the API and player offline, against fake guilds and stub backends
+
+    python -m benchmarks.run --guilds 50 --notifies 3 --duration 20
+
+Every guild starts a stream over /stream and then sends TTS over /notify
+while it plays. Resolving, synthesis and voice handshakes are stubbed with
+the latencies given; everything between the HTTP request and the audio
+frames is the real code. Reports time to first audio, handler latency,
+event loop lag and CPU per stream.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from openclaw_voice import api, metrics, player, resolver, tts, watchdog
+from openclaw_voice.client import VoiceAPIClient, VoiceAPIError
+from openclaw_voice.session import sessions
+
+from .fakes import (
+    FakeBot, FakeGuild, FakeVoiceChannel, FrameStats, StubExtractorPool, StubTTSEngine,
+    ToneSource, wav_to_pcm
+)
+
+logger = logging.getLogger(__name__)
+
+# Event loop lag is sampled by sleeping this long (seconds) and measuring the overshoot
+LAG_INTERVAL = 0.01
+
+
+def percentile(values, p):
+    """Nearest-rank percentile (None for no values)"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def summarize(values, scale=1000):
+    """p50 / p99 / max of a list of seconds, in milliseconds"""
+    return {
+        'count': len(values),
+        'p50': _round(percentile(values, 50), scale),
+        'p99': _round(percentile(values, 99), scale),
+        'max': _round(max(values) if values else None, scale),
+    }
+
+
+def _round(value, scale):
+    return None if value is None else round(value * scale, 1)
+
+
+class Recorder:
+    """Timings collected during a run"""
+
+    def __init__(self):
+        self.handlers = defaultdict(list)  # endpoint -> seconds
+        self.errors = defaultdict(int)     # endpoint -> failed requests
+        self.first_audio = defaultdict(list)  # lane -> seconds
+        self.loop_lag = []
+
+    async def timed(self, endpoint, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        except VoiceAPIError as e:
+            self.errors[endpoint] += 1
+            logger.warning(f"{endpoint} failed: {e}")
+        finally:
+            self.handlers[endpoint].append(time.perf_counter() - start)
+
+    def watch_first_audio(self):
+        """Keep every time-to-first-audio observation, besides the histogram"""
+        observe = metrics.first_audio_seconds.observe
+
+        def record(value, **labels):
+            self.first_audio[labels.get('lane')].append(value)
+            observe(value, **labels)
+
+        metrics.first_audio_seconds.observe = record
+
+    async def watch_loop(self, stop):
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.loop_lag.append(loop.time() - start - LAG_INTERVAL)
+
+
+def make_tone_file(directory, seconds):
+    """An Ogg Opus tone for ffmpeg to stream, like a YouTube audio format"""
+    path = os.path.join(directory, 'tone.ogg')
+    subprocess.run([
+        'ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', f'sine=frequency=220:duration={seconds}',
+        '-ac', '2', '-ar', '48000', '-c:a', 'libopus', '-b:a', '128k', path
+    ], check=True)
+    return path
+
+
+async def serve_media(path):
+    """Serve the tone file over HTTP, so ffmpeg reads it like a stream URL"""
+    async def tone(request):
+        return web.FileResponse(path)
+
+    app = web.Application()
+    app.router.add_get('/tone.ogg', tone)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def install_stubs(args, directory, stream_url):
+    """Swap the network-facing backends for stand-ins"""
+    resolver._pool = StubExtractorPool(args.resolve_ms / 1000, stream_url)
+    tts.register_engine(StubTTSEngine(args.tts_ms / 1000))
+    tts.audio_cache = tts.AudioCache(os.path.join(directory, 'tts'), 256 * 2**20)
+    if not args.ffmpeg:
+        tts.to_pcm = wav_to_pcm
+        player._stream_source = lambda info: ToneSource(args.stream_seconds)
+
+
+def make_guilds(args):
+    bot = FakeBot()
+    channels = []
+    for n in range(args.guilds):
+        guild = FakeGuild(1000 + n)
+        channels.append(FakeVoiceChannel(
+            2000 + n, guild, connect_latency=args.connect_ms / 1000, encode=args.encode
+        ))
+        bot.add_guild(guild)
+    return bot, channels
+
+
+async def run_guild(args, client, recorder, n, channel):
+    """One guild: a stream, then TTS over it now and then"""
+    await asyncio.sleep(random.uniform(0, args.ramp))
+    url = f'https://www.youtube.com/watch?v=bench{0 if args.broadcast else n:06d}'
+    await recorder.timed('/stream', client.stream(url, channel.id, broadcast=args.broadcast))
+    for k in range(args.notifies):
+        await asyncio.sleep(random.uniform(0.5, 1.5) * args.notify_gap)
+        sentences = [f'Message {k} for guild {n}, sentence {s}.' for s in range(args.sentences)]
+        await recorder.timed('/notify', client.notify(' '.join(sentences), channel.id, engine='bench'))
+
+
+async def scrape(client, recorder, stop):
+    """Poll /status and /metrics the way a dashboard would"""
+    while not stop.is_set():
+        await recorder.timed('/status', client.status())
+        await recorder.timed('/metrics', client.request('GET', '/metrics'))
+        await asyncio.sleep(1)
+
+
+async def wait_stopped(channels):
+    """Let every play thread exit and hand its after-callback to the loop"""
+    loop = asyncio.get_running_loop()
+    clients = [vc for channel in channels for vc in channel.voice_clients]
+    for vc in clients:
+        vc.stop()
+    await asyncio.gather(*(loop.run_in_executor(None, vc.join) for vc in clients))
+    await asyncio.sleep(0.1)
+
+
+def playing_streams():
+    return sum(1 for s in sessions.values() if s.lanes['music'].current is not None)
+
+
+async def benchmark(args):
+    directory = tempfile.mkdtemp(prefix='openclaw-bench-')
+    media = None
+    try:
+        stream_url = 'http://stub.invalid/audio.ogg'
+        if args.ffmpeg:
+            media = await serve_media(make_tone_file(directory, args.stream_seconds))
+            stream_url = str(media.make_url('/tone.ogg'))
+        install_stubs(args, directory, stream_url)
+
+        bot, channels = make_guilds(args)
+        api.bot = bot
+        api.set_state('ready')
+        app = web.Application()
+        api.setup_api(app, 0)
+        server = TestServer(app)
+        await server.start_server()
+
+        recorder = Recorder()
+        recorder.watch_first_audio()
+        watchdog.start()
+        stop = asyncio.Event()
+        watchers = [asyncio.ensure_future(recorder.watch_loop(stop))]
+
+        client = VoiceAPIClient(
+            str(server.make_url('')), timeout=60, retries=0, max_connections=args.guilds * 2
+        )
+        try:
+            watchers.append(asyncio.ensure_future(scrape(client, recorder, stop)))
+
+            # Ramp up: every guild starts its stream and speech
+            ramp_start = time.perf_counter()
+            await asyncio.gather(*(
+                run_guild(args, client, recorder, n, channel) for n, channel in enumerate(channels)
+            ))
+            ramp_seconds = time.perf_counter() - ramp_start
+
+            # Steady state: every guild streaming
+            streams = playing_streams()
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            await asyncio.sleep(args.duration)
+            cpu = time.process_time() - cpu_start
+            wall = time.perf_counter() - wall_start
+
+            await recorder.timed('/control', client.control('stop'))
+            await wait_stopped(channels)
+        finally:
+            stop.set()
+            for task in watchers:
+                task.cancel()
+            await asyncio.gather(*watchers, return_exceptions=True)
+            await client.close()
+            await server.close()
+
+        frames = FrameStats()
+        for channel in channels:
+            for vc in channel.voice_clients:
+                frames.merge(vc.stats)
+
+        return {
+            'guilds': args.guilds,
+            'ramp_seconds': round(ramp_seconds, 2),
+            'time_to_first_audio_ms': {
+                lane: summarize(values) for lane, values in sorted(recorder.first_audio.items())
+            },
+            'handler_latency_ms': {
+                endpoint: dict(summarize(values), errors=recorder.errors[endpoint])
+                for endpoint, values in sorted(recorder.handlers.items())
+            },
+            'loop_lag_ms': summarize(recorder.loop_lag),
+            'loop_stalls': watchdog.worst_stalls()[:3],
+            'steady_state': {
+                'streams': streams,
+                'seconds': round(wall, 2),
+                'cpu_percent': round(100 * cpu / wall, 1),
+                'cpu_percent_per_stream': round(100 * cpu / wall / streams, 2) if streams else None,
+            },
+            'frames': {
+                'sent': frames.frames,
+                'opus': frames.opus_frames,
+                'late': frames.late_frames,
+                'read_us_mean': round(1e6 * frames.read_seconds / frames.frames, 1) if frames.frames else None,
+            },
+            'extractor_jobs': resolver._pool.jobs,
+        }
+    finally:
+        if media:
+            await media.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def print_report(report):
+    print(f"\n{report['guilds']} guilds, ramp-up took {report['ramp_seconds']}s\n")
+    print(f"{'':28}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+
+    def row(name, stats, extra=''):
+        cells = [f"{stats[key]:>10}" if stats[key] is not None else f"{'-':>10}"
+                 for key in ('p50', 'p99', 'max')]
+        print(f"{name:28}{stats['count']:>8}{''.join(cells)}{extra}")
+
+    for lane, stats in report['time_to_first_audio_ms'].items():
+        row(f'first audio ({lane})', stats)
+    for endpoint, stats in report['handler_latency_ms'].items():
+        row(endpoint, stats, f"  ({stats['errors']} errors)" if stats['errors'] else '')
+    row('event loop lag', report['loop_lag_ms'])
+
+    steady = report['steady_state']
+    frames = report['frames']
+    print(f"\nSteady state: {steady['streams']} streams for {steady['seconds']}s, "
+          f"CPU {steady['cpu_percent']}% ({steady['cpu_percent_per_stream']}% per stream, "
+          f"bot process only)")
+    print(f"Frames: {frames['sent']} sent ({frames['opus']} Opus), {frames['late']} late, "
+          f"{frames['read_us_mean']} us per read")
+    for stall in report['loop_stalls']:
+        print(f"Loop stall: {stall['ms']} ms at {stall['where']} (from {stall['origin']})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--guilds', type=int, default=20, help='concurrent guilds')
+    parser.add_argument('--notifies', type=int, default=2, help='TTS messages per guild')
+    parser.add_argument('--sentences', type=int, default=1, help='sentences per TTS message')
+    parser.add_argument('--notify-gap', type=float, default=1.0, help='seconds between TTS messages')
+    parser.add_argument('--ramp', type=float, default=2.0, help='seconds over which guilds start')
+    parser.add_argument('--duration', type=float, default=10.0, help='steady-state seconds measured')
+    parser.add_argument('--resolve-ms', type=float, default=300, help='stub extractor latency')
+    parser.add_argument('--tts-ms', type=float, default=200, help='stub TTS engine latency')
+    parser.add_argument('--connect-ms', type=float, default=150, help='fake voice handshake latency')
+    parser.add_argument('--stream-seconds', type=float, default=None,
+                        help='stream length (default: long enough to outlast the run)')
+    parser.add_argument('--ffmpeg', action='store_true',
+                        help='stream and decode through real ffmpeg processes')
+    parser.add_argument('--broadcast', action='store_true',
+                        help='every guild plays the same stream, shared as one broadcast')
+    parser.add_argument('--encode', action='store_true',
+                        help='Opus encode PCM frames like discord.py (needs libopus)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+    if args.stream_seconds is None:
+        args.stream_seconds = args.ramp + args.notifies * 1.5 * args.notify_gap + args.duration + 30
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    if args.ffmpeg and not shutil.which('ffmpeg'):
+        sys.exit("--ffmpeg needs ffmpeg on PATH")
+    random.seed(args.seed)
+
+    report = asyncio.run(benchmark(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
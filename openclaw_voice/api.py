@@ -2,108 +2,170 @@
 OpenClaw Voice - HTTP API Server
 For external triggers (like OpenClaw)
 """
+import asyncio
+import json
 import logging
+import time
 
 import discord
 from aiohttp import web
 from aiohttp.web import TCPSite
 
+from . import broadcast
+from . import jobs
+from . import media_cache
+from . import metrics
 from . import player
-from .config import BOT_NAME, should_respond_in_text
+from . import resolver
+from . import tts
+from . import watchdog
+from .config import (
+    BOT_NAME, BATCH_CONCURRENCY, BATCH_MAX_OPERATIONS, SHARD_COUNT, SHARD_IDS,
+    should_respond_in_text
+)
+from .voice_index import voice_index
 
 logger = logging.getLogger(__name__)
 
 # Bot reference (set by main)
 bot = None
 
+# Bot lifecycle for /status: starting (API up, not logged in yet) -> ready,
+# and reconnecting while the gateway connection is down
+readiness = {'state': 'starting', 'since': time.time()}
+
+
+def set_state(state):
+    if readiness['state'] != state:
+        readiness.update(state=state, since=time.time())
+
+
+@web.middleware
+async def readiness_middleware(request, handler):
+    """Turn away POSTs (they all need Discord) until the bot has been ready once"""
+    if request.method == 'POST' and readiness['state'] == 'starting':
+        return web.json_response(
+            {'error': 'Bot is starting', 'state': readiness['state']},
+            status=503, headers={'Retry-After': '2'}
+        )
+    return await handler(request)
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    """Count and time requests per route"""
+    resource = request.match_info.route.resource
+    endpoint = resource.canonical if resource else 'other'
+    status = 500
+    try:
+        with metrics.request_seconds.time(endpoint=endpoint):
+            response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    except asyncio.CancelledError:
+        status = 499  # Client went away (nginx's "client closed request"), not our error
+        raise
+    finally:
+        metrics.requests_total.inc(endpoint=endpoint, status=status)
+        if status >= 500:
+            metrics.errors_total.inc(stage='api')
+
 
 def setup_api(app, notifier_port):
     """Setup HTTP API routes"""
     
-    async def notify_handler(request):
-        """TTS notification - speak a message"""
-        try:
-            data = await request.json()
-            message = data.get('message', '')
-            channel_id = data.get('channel_id')
-            
-            if not message:
-                return web.json_response({'error': 'No message provided'}, status=400)
-            
-            # Find channel
-            if channel_id:
-                channel = bot.get_channel(int(channel_id))
-            else:
-                # Use first available voice channel
-                channel = None
-                for vc in player.voice_clients.values():
-                    if vc and vc.channel:
-                        channel = vc.channel
-                        break
-            
-            if not channel:
-                return web.json_response({'error': 'No voice channel available'}, status=400)
-            
-            # Play TTS
-            await player.play_tts(channel, message, channel.guild.id)
-            
-            logger.info(f"TTS notification: {message[:50]}")
-            
-            # Optionally respond in text channel too
-            if should_respond_in_text():
-                text_channel = channel  # Same channel for text
-                try:
-                    await text_channel.send(f"🎙️ {message}")
-                except Exception as e:
-                    logger.warning(f"Text response failed: {e}")
-            
-            return web.json_response({'status': 'playing', 'message': message})
-            
-        except Exception as e:
-            logger.error(f"Notify error: {e}")
-            return web.json_response({'error': str(e)}, status=500)
+    app.middlewares.append(metrics_middleware)
+    app.middlewares.append(readiness_middleware)
     
+    def find_channel(channel_id):
+        """Voice channel by ID, or the first one we're connected to"""
+        if channel_id:
+            return bot.get_channel(int(channel_id))
+        for session in player.sessions.values():
+            if session.is_connected():
+                return session.vc.channel
+        return None
     
-    async def stream_handler(request):
-        """Play a stream URL"""
-        try:
-            data = await request.json()
-            url = data.get('url', '')
-            channel_id = data.get('channel_id')
-            
-            if not url:
-                return web.json_response({'error': 'No URL provided'}, status=400)
-            
-            # Find channel
-            if channel_id:
-                channel = bot.get_channel(int(channel_id))
-            else:
-                channel = None
-                for vc in player.voice_clients.values():
-                    if vc and vc.channel:
-                        channel = vc.channel
-                        break
-            
-            if not channel:
-                return web.json_response({'error': 'No voice channel available'}, status=400)
-            
-            # Play
-            await player.play_url(channel, url, channel.guild.id)
-            
-            logger.info(f"Streaming: {url[:50]}")
-            
-            # Optionally respond in text channel too
-            if should_respond_in_text():
-                try:
-                    await channel.send("🎵 Now playing!")
-                except Exception as e:
-                    logger.warning(f"Text response failed: {e}")
-            
-            return web.json_response({'status': 'playing', 'url': url})
+    
+    async def notify(data, on_event=None):
+        """Queue a TTS message; returns (response, HTTP status)"""
+        message = data.get('message', '')
+        channel_id = data.get('channel_id')
+        engine = data.get('engine')
+        
+        if not message:
+            return {'error': 'No message provided'}, 400
+        
+        if engine and engine not in tts.engines:
+            return {'error': f'Unknown engine: {engine}'}, 400
+        
+        # Find channel
+        channel = find_channel(channel_id)
+        
+        if not channel:
+            return {'error': 'No voice channel available'}, 400
             
-        except Exception as e:
-            logger.error(f"Stream error: {e}")
-            return web.json_response({'error': str(e)}, status=500)
+        # Queue TTS (or speak right away with "now")
+        position = await player.enqueue_tts(
+            channel, message, channel.guild.id,
+            lang=data.get('lang', 'en'), engine=engine, voice=data.get('voice'),
+            now=bool(data.get('now')), on_event=on_event
+        )
+        
+        logger.info(f"TTS notification: {message[:50]}")
+        
+        # Optionally respond in text channel too
+        if should_respond_in_text():
+            text_channel = channel  # Same channel for text
+            try:
+                await text_channel.send(f"🎙️ {message}")
+            except Exception as e:
+                logger.warning(f"Text response failed: {e}")
+        
+        return {
+            'status': 'playing' if position == 0 else 'queued',
+            'position': position,
+            'message': message
+        }, 200
+    
+    
+    async def stream(data, on_event=None):
+        """Queue a stream URL; returns (response, HTTP status)"""
+        url = data.get('url', '')
+        channel_id = data.get('channel_id')
+        
+        if not url:
+            return {'error': 'No URL provided'}, 400
+        
+        # Find channel
+        channel = find_channel(channel_id)
+        
+        if not channel:
+            return {'error': 'No voice channel available'}, 400
+        
+        # Queue (or play right away with "now")
+        position = await player.enqueue_url(
+            channel, url, channel.guild.id, now=bool(data.get('now')), on_event=on_event,
+            broadcast=bool(data.get('broadcast'))
+        )
+        
+        logger.info(f"Streaming: {url[:50]}")
+        
+        # Optionally respond in text channel too
+        if should_respond_in_text():
+            try:
+                await channel.send("🎵 Now playing!" if position == 0 else f"📋 Queued (#{position})")
+            except Exception as e:
+                logger.warning(f"Text response failed: {e}")
+        
+        return {
+            'status': 'playing' if position == 0 else 'queued',
+            'position': position,
+            'url': url
+        }, 200
     
     
     async def search_handler(request):
@@ -124,69 +186,305 @@ def setup_api(app, notifier_port):
         """Health check"""
         return web.json_response({
             'status': 'ok',
+            'ready': readiness['state'] == 'ready',
+            'state': readiness['state'],
+            'state_since': readiness['since'],
             'bot_name': BOT_NAME,
-            'active_voice_connections': len(player.voice_clients)
+            'active_voice_connections': sum(1 for s in player.sessions.values() if s.is_connected()),
+            'voice_connections': player.session_stats(),
+            'caches': dict(resolver.cache_stats(), tts=tts.audio_cache.stats(),
+                           media=media_cache.stats()),
+            'broadcasts': broadcast.stats(),
+            'event_loop': watchdog.stats(),
+            'shards': {'ids': SHARD_IDS, 'count': SHARD_COUNT} if SHARD_IDS else None
         })
     
     
+    def parse_user_id(user_id):
+        """User ID from an ID or a <@mention> (None if invalid)"""
+        user_id = str(user_id or '').replace('<@', '').replace('>', '').replace('!', '')
+        return int(user_id) if user_id.isdigit() else None
+    
+    
+    def voice_info(user_id):
+        """Where a user is in voice, from the voice index"""
+        channel = voice_index.get(user_id)
+        if channel is None:
+            return {
+                'in_voice': False,
+                'message': 'User not in any voice channel'
+            }
+        return {
+            'in_voice': True,
+            'channel_id': str(channel.id),
+            'channel_name': channel.name,
+            'guild_id': str(channel.guild.id),
+            'guild_name': channel.guild.name
+        }
+    
+    
     async def voice_handler(request):
         """Get voice channel info - checks any user in any guild the bot is in"""
         try:
             data = await request.json()
-            user_id = str(data.get('user_id', '')).replace('<@', '').replace('>', '').replace('!', '')
+            user_id = parse_user_id(data.get('user_id'))
             
             if not user_id:
                 return web.json_response({'error': 'user_id required'}, status=400)
             
-            logger.info(f"Checking voice for user_id: {user_id}, bot guilds: {[g.id for g in bot.guilds]}")
+            return web.json_response(voice_info(user_id))
             
-            # Search all guilds the bot is in
-            for guild in bot.guilds:
-                logger.info(f"Checking guild {guild.id}, voice_channels: {len(guild.voice_channels)}")
-                # Get all voice channels and check who's in them
-                for channel in guild.voice_channels:
-                    for member in channel.members:
-                        logger.info(f"  Channel {channel.name}: member {member.id} ({member.name})")
-                        if str(member.id) == user_id:
-                            return web.json_response({
-                                'in_voice': True,
-                                'channel_id': str(channel.id),
-                                'channel_name': channel.name,
-                                'guild_id': str(guild.id),
-                                'guild_name': guild.name
-                            })
+        except Exception as e:
+            logger.error(f"Voice check error: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+    
+    
+    async def channel_handler(request):
+        """Guild of a channel this bot can see (used by the shard front to route)"""
+        channel_id = request.match_info['channel_id']
+        channel = bot.get_channel(int(channel_id)) if channel_id.isdigit() else None
+        if channel is None or not hasattr(channel, 'guild'):
+            return web.json_response({'error': 'Unknown channel'}, status=404)
+        return web.json_response({
+            'channel_id': str(channel.id),
+            'channel_name': channel.name,
+            'guild_id': str(channel.guild.id)
+        })
+    
+    
+    async def voice_bulk_handler(request):
+        """Voice channel info for many users at once"""
+        try:
+            data = await request.json()
+            user_ids = data.get('user_ids')
             
-            return web.json_response({
-                'in_voice': False,
-                'message': 'User not in any voice channel'
-            })
+            if not isinstance(user_ids, list) or not user_ids:
+                return web.json_response({'error': 'user_ids list required'}, status=400)
+            
+            results = {}
+            for raw_id in user_ids:
+                user_id = parse_user_id(raw_id)
+                results[str(raw_id)] = voice_info(user_id) if user_id else {'error': 'Invalid user_id'}
+            
+            return web.json_response({'results': results})
             
         except Exception as e:
             logger.error(f"Voice check error: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
     
+    async def control(data, on_event=None):
+        """Control playback; returns (response, HTTP status)"""
+        action = data.get('action', 'stop')
+        guild_id = data.get('guild_id')
+        
+        if action == 'stop':
+            if guild_id:
+                await player.disconnect(int(guild_id))
+            else:
+                # Stop all
+                for gid in list(player.sessions.keys()):
+                    await player.disconnect(gid)
+            
+            return {'status': 'stopped'}, 200
+        
+        if action == 'enqueue':
+            channel = find_channel(data.get('channel_id'))
+            if not channel:
+                return {'error': 'No voice channel available'}, 400
+            if data.get('url'):
+                position = await player.enqueue_url(
+                    channel, data['url'], channel.guild.id, on_event=on_event,
+                    broadcast=bool(data.get('broadcast'))
+                )
+            elif data.get('message'):
+                position = await player.enqueue_tts(
+                    channel, data['message'], channel.guild.id,
+                    lang=data.get('lang', 'en'), engine=data.get('engine'), voice=data.get('voice'),
+                    on_event=on_event
+                )
+            else:
+                return {'error': 'url or message required'}, 400
+            return {
+                'status': 'playing' if position == 0 else 'queued',
+                'position': position
+            }, 200
+        
+        if action not in ('skip', 'clear', 'queue'):
+            return {'error': 'Unknown action'}, 400
+        
+        if not guild_id:
+            return {'error': 'guild_id required'}, 400
+        guild_id = int(guild_id)
+        
+        if action == 'skip':
+            return {'status': 'skipped', 'skipped': player.skip(guild_id)}, 200
+        if action == 'clear':
+            return {'status': 'cleared', 'removed': player.clear(guild_id)}, 200
+        return player.list_queue(guild_id), 200
+    
+    
+    operations = {'notify': notify, 'stream': stream, 'control': control}
+    
+    
+    async def run_operation(op, data, on_event=None):
+        """Run a notify / stream / control operation, turning errors into a 500"""
+        try:
+            return await operations[op](data, on_event)
+        except Exception as e:
+            logger.error(f"{op.capitalize()} error: {e}")
+            return {'error': str(e)}, 500
+    
+    
+    async def handle(request, op):
+        try:
+            data = await request.json()
+        except Exception as e:
+            logger.error(f"{op.capitalize()} error: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+        
+        if data.get('async'):
+            # Answer right away; the caller follows the job instead
+            job = jobs.start(op, lambda job: run_operation(op, data, job.emit))
+            return web.json_response({
+                'status': 'accepted',
+                'job_id': job.id,
+                'job_url': f'/jobs/{job.id}',
+                'events_url': f'/jobs/{job.id}/events'
+            }, status=202)
+        
+        response, status = await run_operation(op, data)
+        return web.json_response(response, status=status)
+    
+    
+    async def notify_handler(request):
+        """TTS notification - speak a message"""
+        return await handle(request, 'notify')
+    
+    
+    async def stream_handler(request):
+        """Play a stream URL"""
+        return await handle(request, 'stream')
+    
+    
     async def control_handler(request):
-        """Control playback (stop, pause, etc.)"""
+        """Control playback (stop, skip, clear, queue, enqueue)"""
+        return await handle(request, 'control')
+    
+    
+    async def metrics_handler(request):
+        """Prometheus metrics"""
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+    
+    
+    async def stalls_handler(request):
+        """The worst event loop stalls so far, with the stack that caused each"""
+        return web.json_response({
+            'event_loop': watchdog.stats(),
+            'stalls': watchdog.worst_stalls()
+        })
+    
+    
+    async def job_handler(request):
+        """State and events of a job started with "async": true"""
+        job = jobs.get(request.match_info['job_id'])
+        if not job:
+            return web.json_response({'error': 'Unknown job'}, status=404)
+        return web.json_response(job.describe())
+    
+    
+    async def job_events_handler(request):
+        """A job's events as Server-Sent Events, until it finishes or fails"""
+        job = jobs.get(request.match_info['job_id'])
+        if not job:
+            return web.json_response({'error': 'Unknown job'}, status=404)
+        
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache'
+        })
+        await response.prepare(request)
+        
+        def sse(entry):
+            return f"event: {entry['event']}\ndata: {json.dumps(entry)}\n\n".encode()
+        
+        past, queue = job.subscribe()
+        try:
+            for entry in past:
+                await response.write(sse(entry))
+            done = job.done
+            while not done:
+                entry = await queue.get()
+                await response.write(sse(entry))
+                done = entry['event'] in jobs.TERMINAL_EVENTS
+        finally:
+            job.unsubscribe(queue)
+        return response
+    
+    
+    def is_stop_all(data):
+        """A control stop without a guild: stops every guild"""
+        return (data.get('op') == 'control' and data.get('action', 'stop') == 'stop'
+                and not data.get('guild_id'))
+    
+    
+    def operation_guild(data):
+        """Guild an operation acts on (None if unknown or all of them)"""
+        try:
+            if data.get('guild_id'):
+                return int(data['guild_id'])
+            if is_stop_all(data):
+                return None
+            channel = find_channel(data.get('channel_id'))
+            return channel.guild.id if channel else None
+        except (TypeError, ValueError):
+            return None
+    
+    
+    async def batch_handler(request):
+        """Several notify / stream / control operations in one request
+        
+        Guilds are worked on in parallel (up to BATCH_CONCURRENCY at a time),
+        and each guild's operations run in the order given. A stop-all is a
+        barrier: everything before it runs first, everything after it waits.
+        """
         try:
             data = await request.json()
-            action = data.get('action', 'stop')
-            guild_id = data.get('guild_id')
+            ops = data.get('operations')
             
-            if action == 'stop':
-                if guild_id:
-                    await player.disconnect(int(guild_id))
-                else:
-                    # Stop all
-                    for gid in list(player.voice_clients.keys()):
-                        await player.disconnect(gid)
-                
-                return web.json_response({'status': 'stopped'})
+            if not isinstance(ops, list) or not ops:
+                return web.json_response({'error': 'operations list required'}, status=400)
+            if len(ops) > BATCH_MAX_OPERATIONS:
+                return web.json_response(
+                    {'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'}, status=400
+                )
             
-            return web.json_response({'error': 'Unknown action'}, status=400)
+            results = [None] * len(ops)
+            phases = [{}]  # Per phase: guild -> operation indexes
+            for index, op in enumerate(ops):
+                if not isinstance(op, dict) or op.get('op') not in operations:
+                    results[index] = {'op': None, 'code': 400, 'error': 'op must be notify, stream or control'}
+                    continue
+                if is_stop_all(op):
+                    phases += [{None: [index]}, {}]
+                    continue
+                phases[-1].setdefault(operation_guild(op), []).append(index)
+            
+            slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+            
+            async def run_guild(indexes):
+                async with slots:
+                    for index in indexes:
+                        response, status = await run_operation(ops[index]['op'], ops[index])
+                        results[index] = dict(response, op=ops[index]['op'], code=status)
+            
+            for by_guild in phases:
+                await asyncio.gather(*(run_guild(indexes) for indexes in by_guild.values()))
+            return web.json_response({'results': results})
             
         except Exception as e:
-            logger.error(f"Control error: {e}")
+            logger.error(f"Batch error: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
     
@@ -194,17 +492,31 @@ def setup_api(app, notifier_port):
     app.router.add_post('/notify', notify_handler)
     app.router.add_post('/stream', stream_handler)
     app.router.add_post('/control', control_handler)
+    app.router.add_post('/batch', batch_handler)
+    app.router.add_get('/jobs/{job_id}', job_handler)
+    app.router.add_get('/jobs/{job_id}/events', job_events_handler)
     app.router.add_post('/voice', voice_handler)
+    app.router.add_post('/voice/bulk', voice_bulk_handler)
+    app.router.add_get('/channels/{channel_id}', channel_handler)
     app.router.add_get('/search', search_handler)
     app.router.add_get('/status', status_handler)
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/debug/stalls', stalls_handler)
     
     return {
         'notify': notify_handler,
         'stream': stream_handler,
         'control': control_handler,
+        'batch': batch_handler,
+        'job': job_handler,
+        'job_events': job_events_handler,
         'search': search_handler,
         'status': status_handler,
+        'metrics': metrics_handler,
+        'stalls': stalls_handler,
         'voice': voice_handler,
+        'voice_bulk': voice_bulk_handler,
+        'channel': channel_handler,
     }
 
 
@@ -216,7 +528,9 @@ async def start_api(bot_instance, notifier_port):
     app = web.Application()
     setup_api(app, notifier_port)
     
-    runner = web.AppRunner(app)
+    # Cancel handlers when the caller disconnects, so abandoned requests
+    # don't keep yt-dlp lookups running
+    runner = web.AppRunner(app, handler_cancellation=True)
     await runner.setup()
     
     site = TCPSite(runner, 'localhost', notifier_port)
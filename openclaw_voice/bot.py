@@ -2,6 +2,7 @@
 OpenClaw Voice - Main Bot
 Entry point for the Discord voice bot
 """
+import asyncio
 import os
 import re
 import logging
@@ -9,9 +10,14 @@ import logging
 import discord
 from discord import app_commands
 
-from .config import BOT_TOKEN, BOT_NAME, NOTIFIER_PORT, VERBOSITY, should_respond
+from .config import (
+    BOT_TOKEN, BOT_NAME, NOTIFIER_PORT, VERBOSITY, SHARD_COUNT, SHARD_IDS, should_respond
+)
 from . import commands
 from . import api
+from . import metrics
+from . import watchdog
+from .voice_index import voice_index
 
 # Setup logging
 logging.basicConfig(
@@ -25,27 +31,107 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.voice_states = True
 
-# Create bot
-bot = discord.Client(intents=intents, activity=discord.Game(name=f"{BOT_NAME} Voice"))
+# Create bot - a shard worker only runs the shards it was given
+if SHARD_IDS:
+    bot = discord.AutoShardedClient(
+        intents=intents, activity=discord.Game(name=f"{BOT_NAME} Voice"),
+        shard_ids=SHARD_IDS, shard_count=SHARD_COUNT
+    )
+else:
+    bot = discord.Client(intents=intents, activity=discord.Game(name=f"{BOT_NAME} Voice"))
 tree = app_commands.CommandTree(bot)
 
 
 @bot.event
-async def on_ready():
-    """Bot ready"""
-    logger.info(f"✅ Logged in as {bot.user} ({BOT_NAME})")
-    
-    # Setup and sync commands
+async def setup_hook():
+    """Logged in, before the gateway connects - runs once per process"""
     commands.setup_commands(tree, bot)
-    await tree.sync()
-    logger.info("Slash commands synced")
+    if SHARD_IDS and 0 not in SHARD_IDS:
+        return  # Commands are global: only the worker with shard 0 syncs them
+    try:
+        await commands.sync_commands(tree, bot)
+    except Exception as e:
+        logger.error(f"Slash command sync failed: {e}")
+
+
+@bot.event
+async def on_ready():
+    """Bot ready (again after every gateway reconnect that couldn't resume)"""
+    logger.info(f"✅ Logged in as {bot.user} ({BOT_NAME})"
+                + (f", shards {SHARD_IDS} of {SHARD_COUNT}" if SHARD_IDS else ''))
     
-    # Start API server
-    await api.start_api(bot, NOTIFIER_PORT)
+    # Who's in voice where, for /voice lookups
+    voice_index.rebuild(bot.guilds)
     
+    api.set_state('ready')
     logger.info(f"📊 Verbosity: {VERBOSITY}")
 
 
+@bot.event
+async def on_disconnect():
+    """Gateway connection lost; discord.py reconnects by itself"""
+    if api.readiness['state'] == 'ready':
+        api.set_state('reconnecting')
+
+
+@bot.event
+async def on_resumed():
+    """Gateway session resumed"""
+    api.set_state('ready')
+
+
+def record_command(interaction, command_name, result):
+    """Slash command metrics; timed from when the interaction was created"""
+    elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    metrics.command_seconds.observe(elapsed, command=command_name)
+    metrics.commands_total.inc(command=command_name, result=result)
+
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    """Slash command finished"""
+    record_command(interaction, command.name, 'ok')
+
+
+@tree.error
+async def on_command_error(interaction, error):
+    """Slash command raised"""
+    command_name = interaction.command.name if interaction.command else 'unknown'
+    record_command(interaction, command_name, 'error')
+    metrics.errors_total.inc(stage='command')
+    logger.error(f"Command {command_name} failed: {error}", exc_info=error)
+
+
+@bot.event
+async def on_voice_state_update(member, before, after):
+    """Keep the voice index current"""
+    voice_index.update(member, before, after)
+
+
+@bot.event
+async def on_guild_available(guild):
+    """Guild came online"""
+    voice_index.add_guild(guild)
+
+
+@bot.event
+async def on_guild_join(guild):
+    """Added to a guild"""
+    voice_index.add_guild(guild)
+
+
+@bot.event
+async def on_guild_unavailable(guild):
+    """Guild went offline"""
+    voice_index.remove_guild(guild.id)
+
+
+@bot.event
+async def on_guild_remove(guild):
+    """Removed from a guild"""
+    voice_index.remove_guild(guild.id)
+
+
 @bot.event
 async def on_message(message):
     """Handle message commands (legacy)"""
@@ -61,11 +147,15 @@ async def on_message(message):
         if message.author.voice:
             query = content.split(' ', 1)[1]
             from . import player
-            url = await player.get_stream_url(query)
+            url = await player.get_stream_url(query, message.guild.id)
             if url:
-                await player.play_url(message.author.voice.channel, url, message.guild.id)
+                position = await player.enqueue_url(
+                    message.author.voice.channel, url, message.guild.id, title=query
+                )
                 if should_respond('minimal'):
-                    await message.channel.send("🎵 Now playing!")
+                    await message.channel.send(
+                        "🎵 Now playing!" if position == 0 else f"📋 Queued (#{position})"
+                    )
             elif should_respond('minimal'):
                 await message.channel.send("❌ Couldn't find it!")
         return
@@ -81,7 +171,7 @@ async def on_message(message):
         if message.author.voice:
             text = content[4:]
             from . import player
-            await player.play_tts(message.author.voice.channel, text, message.guild.id)
+            await player.enqueue_tts(message.author.voice.channel, text, message.guild.id)
             if should_respond('normal'):
                 await message.channel.send(f"🗣️ Saying: {text}")
         elif should_respond('minimal'):
@@ -89,13 +179,24 @@ async def on_message(message):
         return
 
 
+async def main():
+    """API first, so it answers (with its readiness) while the bot logs in"""
+    watchdog.start()
+    await api.start_api(bot, NOTIFIER_PORT)
+    async with bot:
+        await bot.start(BOT_TOKEN)
+
+
 def run():
     """Run the bot"""
     if not BOT_TOKEN:
         logger.error("DISCORD_BOT_TOKEN not set in .env")
         exit(1)
     
-    bot.run(BOT_TOKEN)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == '__main__':
@@ -0,0 +1,214 @@
+"""
+OpenClaw Voice - Broadcasts
+One upstream ffmpeg per source, shared by every guild playing it
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import discord
+
+from .config import BROADCAST_BUFFER_MS
+from .sources import FRAME_SECONDS, SILENCE, ffmpeg_failed
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# A 20 ms Opus frame of silence (what discord.py sends when it stops speaking)
+OPUS_SILENCE = b'\xf8\xff\xfe'
+
+# If the upstream falls further behind than this (seconds), e.g. while the
+# network stalls, the pacing clock restarts instead of bursting to catch up
+MAX_DRIFT = 0.2
+
+_broadcasts = {}  # key -> Broadcast
+_lock = threading.Lock()
+
+
+class Listener(discord.AudioSource):
+    """One guild's view of a broadcast, starting at the live edge
+
+    Frames are buffered per listener, up to BROADCAST_BUFFER_MS; a listener
+    that falls behind drops its oldest frames. If the next frame isn't
+    there yet, read() returns silence instead of blocking (audible stays
+    False until a real frame has been read). Playback ends once the
+    upstream has ended and the buffer is played out.
+    """
+
+    def __init__(self, broadcast, buffer_frames):
+        self.broadcast = broadcast
+        self.audible = False
+        self._frames = deque(maxlen=buffer_frames)
+        self._ready = threading.Condition()
+        self._opus = broadcast.source.is_opus()
+        self.ended = False
+
+    def push(self, frame):
+        with self._ready:
+            self._frames.append(frame)
+            self._ready.notify()
+
+    def finish(self):
+        with self._ready:
+            self.ended = True
+            self._ready.notify()
+
+    def read(self):
+        with self._ready:
+            if not self._frames and not self.ended:
+                self._ready.wait(FRAME_SECONDS)
+            if self._frames:
+                self.audible = True
+                return self._frames.popleft()
+            if self.ended:
+                return b''
+            return OPUS_SILENCE if self._opus else SILENCE
+
+    def is_opus(self):
+        return self._opus
+
+    def cleanup(self):
+        self.finish()
+        self.broadcast.unsubscribe(self)
+
+
+class Broadcast:
+    """An upstream source read at playback speed on its own thread
+
+    Each frame goes to every listener. The source is stopped when the last
+    listener leaves, or when it runs out; either way the broadcast is
+    forgotten, so the next subscriber starts a fresh one.
+    """
+
+    def __init__(self, key, source):
+        self.key = key
+        self.source = source
+        self.listeners = set()
+        self.started = time.monotonic()
+        self.frames = 0
+        self.peak_listeners = 0
+        self.failed = False  # Upstream ffmpeg exited with an error by itself
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'broadcast-{key}'[:60], daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def subscribe(self, buffer_frames):
+        listener = Listener(self, buffer_frames)
+        self.listeners.add(listener)
+        self.peak_listeners = max(self.peak_listeners, len(self.listeners))
+        return listener
+
+    def unsubscribe(self, listener):
+        with _lock:
+            self.listeners.discard(listener)
+            if self.listeners:
+                return
+            self._forget()
+        self._stop.set()
+
+    def _forget(self):
+        # Called with _lock held
+        if _broadcasts.get(self.key) is self:
+            del _broadcasts[self.key]
+
+    def _run(self):
+        clock = time.perf_counter()
+        sent = 0
+        error = None
+        ran_out = False
+        try:
+            while not self._stop.is_set():
+                frame = self.source.read()
+                if not frame:
+                    ran_out = True
+                    break
+                with _lock:
+                    listeners = list(self.listeners)
+                for listener in listeners:
+                    listener.push(frame)
+                self.frames += 1
+
+                sent += 1
+                delay = clock + sent * FRAME_SECONDS - time.perf_counter()
+                if delay > 0:
+                    self._stop.wait(delay)
+                elif delay < -MAX_DRIFT:
+                    clock, sent = time.perf_counter(), 0
+        except Exception as e:
+            error = e
+            metrics.errors_total.inc(stage='broadcast')
+            logger.error(f"Broadcast {self.key} failed: {e}")
+        finally:
+            # Before the listeners finish (their after-callbacks look at it)
+            # and before cleanup() drops the process
+            self.failed = ran_out and ffmpeg_failed(self.source)
+            with _lock:
+                self._forget()
+                listeners = list(self.listeners)
+            for listener in listeners:
+                listener.finish()
+            try:
+                self.source.cleanup()
+            except Exception as e:
+                logger.warning(f"Broadcast source cleanup failed: {e}")
+        if not error:
+            logger.info(f"Broadcast {self.key} ended after {self.frames * FRAME_SECONDS:.0f}s "
+                        f"(up to {self.peak_listeners} listeners)")
+
+    def describe(self):
+        return {
+            'key': self.key,
+            'listeners': len(self.listeners),
+            'peak_listeners': self.peak_listeners,
+            'seconds': round(time.monotonic() - self.started, 1),
+        }
+
+
+def subscribe(key, make_source):
+    """A Listener on the broadcast for key, started with make_source() if it isn't running"""
+    buffer_frames = max(1, round(BROADCAST_BUFFER_MS / 1000 / FRAME_SECONDS))
+    with _lock:
+        broadcast = _broadcasts.get(key)
+        if broadcast is not None:
+            return broadcast.subscribe(buffer_frames)
+
+    # Starts ffmpeg, so not while holding the lock every broadcast takes per frame
+    source = make_source()
+    with _lock:
+        broadcast = _broadcasts.get(key)
+        started = broadcast is None
+        if started:
+            broadcast = _broadcasts[key] = Broadcast(key, source)
+        listener = broadcast.subscribe(buffer_frames)
+    if started:
+        broadcast.start()
+        logger.info(f"Broadcast {key} started")
+    else:
+        source.cleanup()  # Someone else started it meanwhile
+    return listener
+
+
+def count():
+    """Broadcasts running (each one ffmpeg process)"""
+    return len(_broadcasts)
+
+
+def stats():
+    """Running broadcasts for /status"""
+    with _lock:
+        broadcasts = list(_broadcasts.values())
+    return {
+        'broadcasts': len(broadcasts),
+        'listeners': sum(len(b.listeners) for b in broadcasts),
+        'running': [b.describe() for b in broadcasts],
+    }
+
+
+@metrics.collector
+def _collect_metrics():
+    with _lock:
+        listeners = sum(len(b.listeners) for b in _broadcasts.values())
+    metrics.broadcast_listeners.set(listeners)
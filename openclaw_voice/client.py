@@ -0,0 +1,179 @@
+"""
+OpenClaw Voice - API Client
+Async client for the voice API, shared by OpenClaw skills
+"""
+import asyncio
+import logging
+import os
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = os.getenv('VOICE_API_URL', 'http://localhost:5000')
+
+# Requests that can be sent again without doing anything twice
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# A cold /stream can wait out a yt-dlp lookup (RESOLVER_TIMEOUT, 30s by
+# default) and then a voice handshake, so allow well over that
+DEFAULT_TIMEOUT = 60
+
+
+class VoiceAPIError(Exception):
+    """The voice API answered with an error, or couldn't be reached"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _retry_after(resp):
+    """Seconds from a Retry-After header (None if missing or not a number)"""
+    try:
+        return max(0.0, float(resp.headers['Retry-After']))
+    except (KeyError, ValueError):
+        return None
+
+
+class VoiceAPIClient:
+    """One keep-alive connection pool to the voice API
+
+    Failed requests are retried with exponential backoff (backoff,
+    2 * backoff, ...), but only when that can't do anything twice: a POST
+    is only resent if it never reached the server (connection refused)
+    or the server turned it away with 503 and Retry-After (still
+    starting). GETs are also retried after timeouts and other 5xx.
+    """
+
+    def __init__(self, base_url=None, timeout=DEFAULT_TIMEOUT, retries=3, backoff=0.25,
+                 max_connections=20):
+        self.base_url = (base_url or DEFAULT_URL).rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self._session = None
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def request(self, method, path, json=None, params=None):
+        """JSON response of a request, raising VoiceAPIError for errors"""
+        data, _ = await self.request_status(method, path, json, params)
+        return data
+
+    async def request_status(self, method, path, json=None, params=None):
+        """(JSON response, HTTP status) of a request, e.g. 202 for an async job"""
+        url = self.base_url + path
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        error = None
+        retry_after = 0
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(max(retry_after, self.backoff * 2 ** (attempt - 1)))
+            retry_after = 0
+            try:
+                async with self.session().request(method, url, json=json, params=params) as resp:
+                    try:
+                        data = await resp.json(content_type=None)
+                    except ValueError:
+                        data = None
+                    if not isinstance(data, dict):
+                        data = {'error': f'HTTP {resp.status}'} if resp.status >= 400 else {}
+                    if resp.status < 400:
+                        return data, resp.status
+                    error = VoiceAPIError(data.get('error') or f'HTTP {resp.status}', resp.status)
+                    if resp.status == 503 and _retry_after(resp) is not None:
+                        retry_after = _retry_after(resp)  # Not acted on, come back later
+                    elif resp.status < 500 or not idempotent:
+                        raise error
+            except aiohttp.ClientConnectorError as e:
+                # Never got to the server, so safe to resend anything
+                error = VoiceAPIError(f"Voice API unreachable: {e}")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    error = VoiceAPIError(f"Voice API timed out after {self.timeout:g}s")
+                else:
+                    error = VoiceAPIError(f"Voice API unreachable: {e}")
+                if not idempotent:
+                    raise error  # It may have been acted on
+            logger.debug(f"{method} {path} failed (attempt {attempt + 1}): {error}")
+        raise error
+
+    async def voice(self, user_id):
+        """Where a user is in voice: {'in_voice', 'channel_id', 'guild_id', ...}"""
+        return await self.request('POST', '/voice', {'user_id': str(user_id)})
+
+    async def voice_bulk(self, user_ids):
+        """/voice answers for many users, keyed by user ID"""
+        data = await self.request('POST', '/voice/bulk', {'user_ids': [str(u) for u in user_ids]})
+        return data.get('results', {})
+
+    async def stream(self, url, channel_id=None, now=False, background=False, broadcast=False):
+        """Queue a stream URL: {'status', 'position', ...} (or a job with background=True)
+
+        With broadcast=True, guilds streaming the same URL share one ffmpeg.
+        """
+        payload = {'url': url, 'now': now, 'async': background}
+        if broadcast:
+            payload['broadcast'] = True
+        if channel_id:
+            payload['channel_id'] = str(channel_id)
+        return await self.request('POST', '/stream', payload)
+
+    async def notify(self, message, channel_id=None, lang=None, engine=None, voice=None,
+                     now=False, background=False):
+        """Queue a TTS message: {'status', 'position', ...} (or a job with background=True)"""
+        payload = {'message': message, 'now': now, 'async': background}
+        for key, value in (('channel_id', channel_id), ('lang', lang),
+                           ('engine', engine), ('voice', voice)):
+            if value is not None:
+                payload[key] = str(value)
+        return await self.request('POST', '/notify', payload)
+
+    async def control(self, action, guild_id=None, **fields):
+        """Run a /control action (stop, skip, clear, queue, enqueue)"""
+        payload = dict(fields, action=action)
+        if guild_id:
+            payload['guild_id'] = str(guild_id)
+        return await self.request('POST', '/control', payload)
+
+    async def search(self, query):
+        """YouTube search results from the bot"""
+        data = await self.request('GET', '/search', params={'q': query})
+        return data.get('results', [])
+
+    async def status(self):
+        return await self.request('GET', '/status')
+
+
+_clients = {}
+
+
+def get_client(base_url=None):
+    """Shared client for base_url (default VOICE_API_URL) on the running loop"""
+    key = (base_url or DEFAULT_URL, asyncio.get_running_loop())
+    client = _clients.get(key)
+    if client is None:
+        # Drop clients left behind by loops that have since closed
+        for old_key in [k for k in _clients if k[1].is_closed()]:
+            del _clients[old_key]
+        client = _clients[key] = VoiceAPIClient(key[0])
+    return client
@@ -2,12 +2,15 @@
 OpenClaw Voice - Commands
 Slash commands and message handlers
 """
+import hashlib
+import json
 import logging
+import os
 
 import discord
 from discord import app_commands
 
-from .config import should_respond, DEFAULT_VOLUME
+from .config import should_respond, DEFAULT_VOLUME, COMMAND_HASH_FILE
 from . import player
 
 logger = logging.getLogger(__name__)
@@ -30,17 +33,21 @@ def setup_commands(tree, bot):
             if should_respond('normal'):
                 await interaction.followup.send(f"🔍 Searching: {query}")
             
-            url = await player.get_stream_url(query)
+            url = await player.get_stream_url(query, interaction.guild_id)
             
             if not url:
                 if should_respond('minimal'):
                     await interaction.followup.send("❌ Couldn't find that!")
                 return
             
-            await player.play_url(interaction.user.voice.channel, url, interaction.guild_id)
+            position = await player.enqueue_url(
+                interaction.user.voice.channel, url, interaction.guild_id, title=query
+            )
             
             if should_respond('minimal'):
-                await interaction.followup.send("🎵 Now playing!")
+                await interaction.followup.send(
+                    "🎵 Now playing!" if position == 0 else f"📋 Queued (#{position})"
+                )
             
         except Exception as e:
             logger.error(f"Play error: {e}")
@@ -53,7 +60,7 @@ def setup_commands(tree, bot):
         await interaction.response.defer()
         
         try:
-            results = await player.search_youtube(query)
+            results = await player.search_youtube(query, guild_id=interaction.guild_id)
             
             if not results:
                 await interaction.followup.send("❌ No results found!")
@@ -75,7 +82,8 @@ def setup_commands(tree, bot):
     
     
     @tree.command(name="say", description="Speak a message in your voice channel")
-    async def say_command(interaction: discord.Interaction, message: str):
+    @app_commands.describe(engine="TTS engine: gtts, espeak or piper")
+    async def say_command(interaction: discord.Interaction, message: str, engine: str = None):
         """TTS in voice channel"""
         if not interaction.user.voice:
             await interaction.response.send_message("❌ Join a voice channel first!", ephemeral=True)
@@ -84,7 +92,9 @@ def setup_commands(tree, bot):
         await interaction.response.defer()
         
         try:
-            await player.play_tts(interaction.user.voice.channel, message, interaction.guild_id)
+            await player.enqueue_tts(
+                interaction.user.voice.channel, message, interaction.guild_id, engine=engine
+            )
             
             if should_respond('normal'):
                 await interaction.followup.send(f"🗣️ Saying: {message}")
@@ -104,10 +114,12 @@ def setup_commands(tree, bot):
         await interaction.response.defer()
         
         try:
-            await player.play_url(interaction.user.voice.channel, url, interaction.guild_id)
+            position = await player.enqueue_url(interaction.user.voice.channel, url, interaction.guild_id)
             
             if should_respond('minimal'):
-                await interaction.followup.send("📡 Streaming...")
+                await interaction.followup.send(
+                    "📡 Streaming..." if position == 0 else f"📋 Queued (#{position})"
+                )
             
         except Exception as e:
             logger.error(f"Stream error: {e}")
@@ -121,9 +133,8 @@ def setup_commands(tree, bot):
             await interaction.response.send_message("❌ Join a voice channel first!", ephemeral=True)
             return
         
-        await player.disconnect(interaction.guild_id)
-        vc = await interaction.user.voice.channel.connect()
-        player.voice_clients[interaction.guild_id] = vc
+        await player.connect(interaction.user.voice.channel, interaction.guild_id)
+        player.schedule_idle(interaction.guild_id)
         
         if should_respond('normal'):
             await interaction.response.send_message(f"✅ Joined {interaction.user.voice.channel.name}!")
@@ -153,6 +164,53 @@ def setup_commands(tree, bot):
             await interaction.response.defer()
     
     
+    @tree.command(name="skip", description="Skip to the next item in the queue")
+    async def skip_command(interaction: discord.Interaction):
+        """Skip current item"""
+        skipped = player.skip(interaction.guild_id)
+        
+        if not skipped:
+            await interaction.response.send_message("❌ Nothing is playing!", ephemeral=True)
+        elif should_respond('minimal'):
+            await interaction.response.send_message(f"⏭️ Skipped: {skipped['title'][:50]}")
+        else:
+            await interaction.response.defer()
+    
+    
+    @tree.command(name="queue", description="Show what's playing and what's up next")
+    async def queue_command(interaction: discord.Interaction):
+        """List the queue"""
+        queue = player.list_queue(interaction.guild_id)
+        
+        speech = queue['speech']
+        if not queue['current'] and not queue['queued'] and not speech['current']:
+            await interaction.response.send_message("📭 Queue is empty!", ephemeral=True)
+            return
+        
+        text = "**Queue:**\n"
+        if speech['current']:
+            text += f"🗣️ {speech['current']['title'][:50]}\n"
+        if queue['current']:
+            text += f"▶️ {queue['current']['title'][:50]}\n"
+        for i, item in enumerate(queue['queued'][:10], 1):
+            text += f"{i}. {item['title'][:50]}\n"
+        if len(queue['queued']) > 10:
+            text += f"...and {len(queue['queued']) - 10} more\n"
+        
+        await interaction.response.send_message(text)
+    
+    
+    @tree.command(name="clear", description="Clear the queue (keeps the current item playing)")
+    async def clear_command(interaction: discord.Interaction):
+        """Clear the queue"""
+        removed = player.clear(interaction.guild_id)
+        
+        if should_respond('minimal'):
+            await interaction.response.send_message(f"🧹 Cleared {removed} queued item(s)!")
+        else:
+            await interaction.response.defer()
+    
+    
     @tree.command(name="notify", description="Ask OpenClaw to process and speak in voice")
     async def notify_command(interaction: discord.Interaction, request: str):
         """Pass to OpenClaw for processing, then speak result"""
@@ -182,5 +240,43 @@ def setup_commands(tree, bot):
         'join': join_command,
         'leave': leave_command,
         'stop': stop_command,
+        'skip': skip_command,
+        'queue': queue_command,
+        'clear': clear_command,
         'notify': notify_command,
     }
+
+
+def command_hash(tree, application_id):
+    """Hash of the command tree as it would be sent to Discord"""
+    payload = []
+    for command in tree.get_commands():
+        try:
+            payload.append(command.to_dict(tree))
+        except TypeError:
+            payload.append(command.to_dict())  # discord.py < 2.4
+    payload.sort(key=lambda c: c.get('name', ''))
+    data = json.dumps({'application_id': application_id, 'commands': payload}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+async def sync_commands(tree, bot):
+    """Sync slash commands unless they match the last synced set; True if synced"""
+    digest = command_hash(tree, bot.application_id)
+    try:
+        with open(COMMAND_HASH_FILE) as f:
+            if f.read().strip() == digest:
+                logger.info("Slash commands unchanged, skipping sync")
+                return False
+    except OSError:
+        pass
+
+    await tree.sync()
+    try:
+        os.makedirs(os.path.dirname(COMMAND_HASH_FILE) or '.', exist_ok=True)
+        with open(COMMAND_HASH_FILE, 'w') as f:
+            f.write(digest + '\n')
+    except OSError as e:
+        logger.warning(f"Could not save command hash: {e}")
+    logger.info("Slash commands synced")
+    return True
@@ -12,6 +12,105 @@ BOT_NAME = os.getenv('BOT_NAME', 'OpenClaw')
 DEFAULT_VOLUME = float(os.getenv('DEFAULT_VOLUME', '0.8'))
 NOTIFIER_PORT = int(os.getenv('NOTIFIER_PORT', '5000'))
 
+# Sharding (python -m openclaw_voice.shards): SHARD_COUNT shards (0 = what
+# Discord recommends) split over SHARD_WORKERS processes (0 = one per CPU).
+# Worker N serves its API on SHARD_WORKER_PORT + N, behind the front API on
+# NOTIFIER_PORT. SHARD_IDS is set for each worker by the supervisor
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', '0'))
+SHARD_WORKER_PORT = int(os.getenv('SHARD_WORKER_PORT', str(NOTIFIER_PORT + 1)))
+SHARD_IDS = [int(i) for i in os.getenv('SHARD_IDS', '').split(',') if i.strip()]
+
+# Hash of the last slash command tree synced to Discord; startup skips the
+# sync while the commands are unchanged (delete the file to force one)
+COMMAND_HASH_FILE = os.getenv(
+    'COMMAND_HASH_FILE', os.path.expanduser('~/.cache/openclaw_voice/commands.sha256')
+)
+
+# /batch: guilds worked on at once, and operations allowed per request
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
+BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', '100'))
+
+# Jobs ("async": true requests) kept for GET /jobs/{id}, most recent first
+JOB_HISTORY = int(os.getenv('JOB_HISTORY', '1000'))
+
+# Seconds a voice connection stays up with nothing playing (0 = leave right away)
+VOICE_IDLE_TIMEOUT = float(os.getenv('VOICE_IDLE_TIMEOUT', '300'))
+
+# Queued items to resolve / synthesize ahead while the current one plays
+QUEUE_PREFETCH = int(os.getenv('QUEUE_PREFETCH', '1'))
+
+# Playlists are queued PLAYLIST_PAGE_SIZE entries at a time, each page read
+# when playback gets to it, up to PLAYLIST_MAX_ENTRIES entries
+PLAYLIST_PAGE_SIZE = int(os.getenv('PLAYLIST_PAGE_SIZE', '50'))
+PLAYLIST_MAX_ENTRIES = int(os.getenv('PLAYLIST_MAX_ENTRIES', '1000'))
+
+# yt-dlp lookups: max concurrent overall, max concurrent per guild, seconds per call
+RESOLVER_CONCURRENCY = int(os.getenv('RESOLVER_CONCURRENCY', '4'))
+RESOLVER_GUILD_CONCURRENCY = int(os.getenv('RESOLVER_GUILD_CONCURRENCY', '2'))
+RESOLVER_TIMEOUT = float(os.getenv('RESOLVER_TIMEOUT', '30'))
+
+# Warm yt-dlp worker processes (0 = run the yt-dlp CLI for every lookup).
+# Workers are replaced after EXTRACTOR_MAX_JOBS jobs or above EXTRACTOR_MAX_RSS_MB.
+EXTRACTOR_WORKERS = int(os.getenv('EXTRACTOR_WORKERS', '2'))
+EXTRACTOR_MAX_JOBS = int(os.getenv('EXTRACTOR_MAX_JOBS', '500'))
+EXTRACTOR_MAX_RSS_MB = int(os.getenv('EXTRACTOR_MAX_RSS_MB', '300'))
+
+# Resolved stream URL cache: max entries (0 = off), seconds to keep URLs
+# with no expire= of their own, seconds of headroom before expire=
+URL_CACHE_SIZE = int(os.getenv('URL_CACHE_SIZE', '512'))
+URL_CACHE_TTL = float(os.getenv('URL_CACHE_TTL', '1800'))
+URL_CACHE_MARGIN = float(os.getenv('URL_CACHE_MARGIN', '600'))
+
+# Search result cache: max queries kept (0 = off), seconds to keep them
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '256'))
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '600'))
+
+# Synthesized speech cache: directory and size budget in MB
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.expanduser('~/.cache/openclaw_voice/tts'))
+TTS_CACHE_MB = int(os.getenv('TTS_CACHE_MB', '200'))
+
+# Speak long messages sentence by sentence as they are synthesized,
+# with up to TTS_STREAM_PARALLELISM sentences in synthesis at once
+TTS_STREAMING = os.getenv('TTS_STREAMING', 'true').lower() == 'true'
+TTS_STREAM_PARALLELISM = int(os.getenv('TTS_STREAM_PARALLELISM', '3'))
+
+# TTS engine: gtts (online), espeak (espeak-ng) or piper (needs TTS_PIPER_MODEL)
+TTS_ENGINE = os.getenv('TTS_ENGINE', 'gtts')
+TTS_THREADS = int(os.getenv('TTS_THREADS', '4'))
+TTS_PROCESSES = int(os.getenv('TTS_PROCESSES', '2'))
+TTS_PIPER_MODEL = os.getenv('TTS_PIPER_MODEL', '')
+
+# Tracks played MEDIA_CACHE_PLAYS times are stored as Ogg Opus under
+# MEDIA_CACHE_DIR (up to MEDIA_CACHE_MB, 0 = off) and played from disk after
+# that. Only tracks up to MEDIA_CACHE_MAX_SECONDS long (never live streams)
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', os.path.expanduser('~/.cache/openclaw_voice/media'))
+MEDIA_CACHE_MB = int(os.getenv('MEDIA_CACHE_MB', '1000'))
+MEDIA_CACHE_PLAYS = int(os.getenv('MEDIA_CACHE_PLAYS', '3'))
+MEDIA_CACHE_MAX_SECONDS = int(os.getenv('MEDIA_CACHE_MAX_SECONDS', '1200'))
+
+# TTS plays over music; music is ducked to DUCK_LEVEL while speech plays,
+# fading down over DUCK_ATTACK_MS and back up over DUCK_RELEASE_MS
+DUCK_LEVEL = float(os.getenv('DUCK_LEVEL', '0.25'))
+DUCK_ATTACK_MS = int(os.getenv('DUCK_ATTACK_MS', '150'))
+DUCK_RELEASE_MS = int(os.getenv('DUCK_RELEASE_MS', '600'))
+
+# Play streams as Opus straight from ffmpeg instead of decoding to PCM.
+# Opus sources (most of YouTube) are only repackaged if DEFAULT_VOLUME is 1.0
+OPUS_PASSTHROUGH = os.getenv('OPUS_PASSTHROUGH', 'true').lower() == 'true'
+
+# Guilds playing the same stream can share one ffmpeg ("broadcast"), each
+# joining at the live edge with up to BROADCAST_BUFFER_MS buffered; live
+# streams are always shared if BROADCAST_LIVE is on
+BROADCAST_LIVE = os.getenv('BROADCAST_LIVE', 'true').lower() == 'true'
+BROADCAST_BUFFER_MS = int(os.getenv('BROADCAST_BUFFER_MS', '500'))
+
+# Watch the event loop for stalls: anything that keeps it busy longer than
+# LOOP_STALL_MS is logged with its stack; the LOOP_STALL_HISTORY worst are kept
+LOOP_WATCHDOG = os.getenv('LOOP_WATCHDOG', 'true').lower() == 'true'
+LOOP_STALL_MS = int(os.getenv('LOOP_STALL_MS', '200'))
+LOOP_STALL_HISTORY = int(os.getenv('LOOP_STALL_HISTORY', '20'))
+
 # Verbosity: silent, minimal, normal, verbose
 VERBOSITY = os.getenv('VERBOSITY', 'minimal')
 
@@ -0,0 +1,198 @@
+"""
+OpenClaw Voice - Extractor Pool
+Long-lived yt-dlp worker processes, each holding warm YoutubeDL instances
+"""
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import signal
+
+logger = logging.getLogger(__name__)
+
+# Prefer Opus audio, which plays without being decoded or re-encoded
+AUDIO_FORMAT = 'bestaudio[acodec=opus]/bestaudio'
+
+RESOLVE_OPTIONS = {
+    'format': AUDIO_FORMAT,
+    'noplaylist': True,
+    'quiet': True,
+    'no_warnings': True,
+}
+
+SEARCH_OPTIONS = {
+    'extract_flat': 'in_playlist',
+    'quiet': True,
+    'no_warnings': True,
+}
+
+# Flat entries of one page of a playlist ('playlist_items' is set per job)
+PLAYLIST_OPTIONS = dict(SEARCH_OPTIONS, lazy_playlist=True)
+
+
+class ExtractorError(Exception):
+    """A job failed in (or took down) an extractor worker"""
+
+
+def available():
+    """Check if yt-dlp can be imported in-process"""
+    return importlib.util.find_spec('yt_dlp') is not None
+
+
+def summarize(info):
+    """Trim a yt-dlp info dict down to what playback needs"""
+    if not info:
+        return None
+    if info.get('entries') is not None:
+        # Search or playlist result - take the first hit
+        entries = list(info['entries'])
+        if not entries:
+            return None
+        info = entries[0]
+    return {
+        'url': info.get('url'),
+        'id': info.get('id'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+        'is_live': bool(info.get('is_live')),
+        'acodec': info.get('acodec'),
+        'webpage_url': info.get('webpage_url'),
+        'extractor': (info.get('extractor_key') or '').lower(),
+    }
+
+
+def _rss_mb():
+    """Current resident memory of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return 0
+
+
+def _worker_main(conn, max_jobs, max_rss_mb):
+    """Worker process: serve (kind, target) jobs from the pipe until retired
+
+    target is a URL or query, or (url, items) for a 'playlist' page.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent handles Ctrl+C
+
+    import yt_dlp
+    ydls = {
+        'resolve': yt_dlp.YoutubeDL(RESOLVE_OPTIONS),
+        'search': yt_dlp.YoutubeDL(SEARCH_OPTIONS),
+        'playlist': yt_dlp.YoutubeDL(PLAYLIST_OPTIONS),
+    }
+
+    jobs = 0
+    while True:
+        try:
+            kind, target = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        jobs += 1
+        try:
+            ydl = ydls[kind]
+            if kind == 'playlist':
+                target, ydl.params['playlist_items'] = target
+            info = ydl.sanitize_info(ydl.extract_info(target, download=False))
+            if kind == 'resolve':
+                reply = ('ok', summarize(info))
+            else:
+                reply = ('ok', list(info.get('entries') or []))
+        except Exception as e:
+            reply = ('error', str(e))
+
+        # Hand back the result first, then bow out if we've done our share
+        recycle = jobs >= max_jobs or _rss_mb() > max_rss_mb
+        conn.send(reply + (recycle,))
+        if recycle:
+            return
+
+
+class _Worker:
+    """Parent-side handle for one worker process"""
+
+    def __init__(self, ctx, max_jobs, max_rss_mb):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, max_jobs, max_rss_mb),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.retired = False
+
+    async def call(self, kind, target):
+        """Send a job and wait for the reply without blocking the loop"""
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = self.conn.fileno()
+
+        def on_readable():
+            if not readable.done():
+                readable.set_result(None)
+
+        loop.add_reader(fd, on_readable)
+        try:
+            self.conn.send((kind, target))
+            await readable
+            status, result, recycle = self.conn.recv()
+        except (EOFError, OSError):
+            self.retired = True
+            raise ExtractorError(f"Extractor worker {self.process.pid} died")
+        finally:
+            loop.remove_reader(fd)
+
+        self.retired = recycle
+        if status == 'error':
+            raise ExtractorError(result)
+        return result
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=0)
+        self.conn.close()
+
+
+class ExtractorPool:
+    """Fixed-size pool of warm extractor workers"""
+
+    def __init__(self, size, max_jobs, max_rss_mb):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.restarts = 0
+        # spawn, not fork: the parent has discord.py and ffmpeg threads running
+        self._ctx = multiprocessing.get_context('spawn')
+        self._idle = None
+
+    def start(self):
+        """Spawn the workers (call from the running loop)"""
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(self._spawn())
+        logger.info(f"Extractor pool started with {self.size} workers")
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.max_jobs, self.max_rss_mb)
+
+    async def run(self, kind, target):
+        """Run a 'resolve' or 'search' job on the next free worker"""
+        worker = await self._idle.get()
+        try:
+            return await worker.call(kind, target)
+        except asyncio.CancelledError:
+            # It's still busy with the abandoned job, so replace it
+            worker.retired = True
+            raise
+        finally:
+            if worker.retired:
+                worker.stop()
+                worker = self._spawn()
+                self.restarts += 1
+            self._idle.put_nowait(worker)
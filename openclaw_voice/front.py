@@ -0,0 +1,387 @@
+"""
+OpenClaw Voice - Shard Front API
+The public API when running sharded: routes each request to the worker owning its guild
+"""
+import asyncio
+import itertools
+import logging
+
+import aiohttp
+from aiohttp import web
+from aiohttp.web import TCPSite
+
+from .api import metrics_middleware
+from .cache import LRUCache
+from .client import VoiceAPIClient, VoiceAPIError
+from .config import BOT_NAME, BATCH_MAX_OPERATIONS
+from .shards import shard_for
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Channel -> guild lookups remembered (a channel never changes guild)
+CHANNEL_CACHE_SIZE = 10000
+
+# Worker requests can wait on a yt-dlp lookup and a voice handshake
+WORKER_TIMEOUT = 60
+
+
+class Router:
+    """Finds the worker that owns a guild or channel"""
+
+    def __init__(self, workers, shard_count):
+        self.workers = workers
+        self.shard_count = shard_count
+        self.clients = {
+            worker.index: VoiceAPIClient(worker.url, timeout=WORKER_TIMEOUT, retries=0)
+            for worker in workers
+        }
+        self._by_shard = {shard: worker for worker in workers for shard in worker.shard_ids}
+        self._channel_guilds = LRUCache(CHANNEL_CACHE_SIZE)
+        self._round_robin = itertools.cycle(workers)
+
+    def for_guild(self, guild_id):
+        return self._by_shard[shard_for(guild_id, self.shard_count)]
+
+    async def for_channel(self, channel_id):
+        """Worker that can see a channel (None if none can), asking all of them once"""
+        guild_id = self._channel_guilds.get(str(channel_id))
+        if guild_id is None:
+            answers = await self.fan_out('GET', f'/channels/{channel_id}')
+            for answer, _ in answers.values():
+                if answer.get('guild_id'):
+                    guild_id = int(answer['guild_id'])
+                    self._channel_guilds.put(str(channel_id), guild_id)
+                    break
+        return self.for_guild(guild_id) if guild_id is not None else None
+
+    async def target(self, data):
+        """Worker for a request body with guild_id or channel_id (None if neither)
+
+        Raises LookupError for a channel no worker can see.
+        """
+        if data.get('guild_id'):
+            return self.for_guild(int(data['guild_id']))
+        if data.get('channel_id'):
+            worker = await self.for_channel(int(data['channel_id']))
+            if worker is None:
+                raise LookupError('Unknown channel')
+            return worker
+        return None
+
+    def any_worker(self):
+        return next(self._round_robin)
+
+    async def call(self, worker, method, path, json=None, params=None):
+        """(response, status) from a worker, errors included"""
+        try:
+            return await self.clients[worker.index].request_status(method, path, json, params)
+        except VoiceAPIError as e:
+            return {'error': str(e)}, e.status or 502
+
+    async def fan_out(self, method, path, json=None):
+        """(response, status) from every worker, by worker index"""
+        answers = await asyncio.gather(*(
+            self.call(worker, method, path, json) for worker in self.workers
+        ))
+        return {worker.index: answer for worker, answer in zip(self.workers, answers)}
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.close()
+
+
+def _job_id(worker, response):
+    """Prefix a worker's job ID with the worker, so /jobs can be routed back"""
+    if 'job_id' in response:
+        job_id = f"{worker.index}.{response['job_id']}"
+        response = dict(
+            response, job_id=job_id, job_url=f'/jobs/{job_id}', events_url=f'/jobs/{job_id}/events'
+        )
+    return response
+
+
+def _answered(answers):
+    """Successful responses from fan_out(), and the first error (None if none failed)"""
+    responses, error = [], None
+    for index in sorted(answers):
+        response, status = answers[index]
+        if status < 400:
+            responses.append(response)
+        elif error is None:
+            error = response, status
+    return responses, error
+
+
+def setup_front(app, router):
+    """Setup the front API routes"""
+
+    app.middlewares.append(metrics_middleware)
+
+    async def dispatch(op, data):
+        """Send one notify / stream / control operation to its worker(s)"""
+        path = f'/{op}'
+        try:
+            worker = await router.target(data)
+        except (LookupError, ValueError) as e:
+            return {'error': str(e)}, 400
+
+        if worker is not None:
+            response, status = await router.call(worker, 'POST', path, data)
+            return _job_id(worker, response), status
+
+        if op == 'control' and data.get('action', 'stop') == 'stop':
+            # Stop all, everywhere
+            answers = await router.fan_out('POST', path, data)
+            failed = [answer for answer, status in answers.values() if status >= 400]
+            return (failed[0], 502) if failed else ({'status': 'stopped'}, 200)
+
+        # No channel given: the first worker with a live voice connection
+        # takes it. One that's down or failing (5xx, or no answer at all) is
+        # passed over too; the last error only comes back if none took it
+        response, status = {'error': 'No voice channel available'}, 400
+        for worker in router.workers:
+            response, status = await router.call(worker, 'POST', path, data)
+            if status != 400 and status < 500:
+                return _job_id(worker, response), status
+        return response, status
+
+
+    async def handle(request, op):
+        try:
+            data = await request.json()
+        except Exception as e:
+            return web.json_response({'error': str(e)}, status=400)
+        response, status = await dispatch(op, data)
+        return web.json_response(response, status=status)
+
+
+    async def notify_handler(request):
+        """TTS notification - speak a message"""
+        return await handle(request, 'notify')
+
+
+    async def stream_handler(request):
+        """Play a stream URL"""
+        return await handle(request, 'stream')
+
+
+    async def control_handler(request):
+        """Control playback (stop, skip, clear, queue, enqueue)"""
+        return await handle(request, 'control')
+
+
+    async def batch_handler(request):
+        """/batch split into one sub-batch per worker, results put back in order
+
+        A stop-all is a barrier, as on a worker: the sub-batches before it
+        run first, then the stop, then the rest.
+        """
+        try:
+            data = await request.json()
+        except Exception as e:
+            return web.json_response({'error': str(e)}, status=400)
+        ops = data.get('operations')
+        if not isinstance(ops, list) or not ops:
+            return web.json_response({'error': 'operations list required'}, status=400)
+        if len(ops) > BATCH_MAX_OPERATIONS:
+            return web.json_response(
+                {'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'}, status=400
+            )
+
+        results = [None] * len(ops)
+        phases = [({}, [])]  # Per phase: (worker index -> (worker, indexes), unrouted indexes)
+        for index, op in enumerate(ops):
+            if not isinstance(op, dict) or op.get('op') not in ('notify', 'stream', 'control'):
+                results[index] = {'op': None, 'code': 400, 'error': 'op must be notify, stream or control'}
+                continue
+            if op['op'] == 'control' and op.get('action', 'stop') == 'stop' and not op.get('guild_id'):
+                phases += [({}, [index]), ({}, [])]
+                continue
+            by_worker, unrouted = phases[-1]
+            try:
+                worker = await router.target(op)
+            except (LookupError, ValueError) as e:
+                results[index] = {'op': op['op'], 'code': 400, 'error': str(e)}
+                continue
+            if worker is None:
+                unrouted.append(index)
+            else:
+                by_worker.setdefault(worker.index, (worker, []))[1].append(index)
+
+        async def run_worker(worker, indexes):
+            response, status = await router.call(
+                worker, 'POST', '/batch', {'operations': [ops[i] for i in indexes]}
+            )
+            answers = response.get('results') if status == 200 else None
+            for position, index in enumerate(indexes):
+                if answers:
+                    results[index] = _job_id(worker, answers[position])
+                else:
+                    results[index] = dict(response, op=ops[index]['op'], code=status)
+
+        async def run_unrouted(unrouted):
+            for index in unrouted:
+                response, status = await dispatch(ops[index]['op'], ops[index])
+                results[index] = dict(response, op=ops[index]['op'], code=status)
+
+        for by_worker, unrouted in phases:
+            await asyncio.gather(
+                run_unrouted(unrouted),
+                *(run_worker(worker, indexes) for worker, indexes in by_worker.values())
+            )
+        return web.json_response({'results': results})
+
+
+    async def voice_handler(request):
+        """Where a user is in voice, asking every worker"""
+        try:
+            data = await request.json()
+        except Exception as e:
+            return web.json_response({'error': str(e)}, status=400)
+        # A worker that's down only hides its own guilds
+        responses, error = _answered(await router.fan_out('POST', '/voice', data))
+        if error and not responses:
+            return web.json_response(error[0], status=error[1])
+        for response in responses:
+            if response.get('in_voice'):
+                return web.json_response(response)
+        return web.json_response({'in_voice': False, 'message': 'User not in any voice channel'})
+
+
+    async def voice_bulk_handler(request):
+        """/voice/bulk on every worker, merged"""
+        try:
+            data = await request.json()
+        except Exception as e:
+            return web.json_response({'error': str(e)}, status=400)
+        responses, error = _answered(await router.fan_out('POST', '/voice/bulk', data))
+        if error and not responses:
+            return web.json_response(error[0], status=error[1])
+        results = {}
+        for response in responses:
+            for user_id, info in response.get('results', {}).items():
+                if user_id not in results or info.get('in_voice'):
+                    results[user_id] = info
+        return web.json_response({'results': results})
+
+
+    async def search_handler(request):
+        """Search for streams (any worker will do)"""
+        response, status = await router.call(
+            router.any_worker(), 'GET', '/search', params=dict(request.query)
+        )
+        return web.json_response(response, status=status)
+
+
+    async def status_handler(request):
+        """Health of every worker, plus totals"""
+        answers = await router.fan_out('GET', '/status')
+        workers = []
+        for worker in router.workers:
+            response, status = answers[worker.index]
+            workers.append(dict(worker.describe(), status=response if status == 200 else None,
+                                error=response.get('error') if status != 200 else None))
+        healthy = [w['status'] for w in workers if w['status']]
+        return web.json_response({
+            'status': 'ok' if len(healthy) == len(workers) else 'degraded',
+            'ready': len(healthy) == len(workers) and all(s.get('ready') for s in healthy),
+            'bot_name': BOT_NAME,
+            'shard_count': router.shard_count,
+            'active_voice_connections': sum(s.get('active_voice_connections', 0) for s in healthy),
+            'workers': workers
+        })
+
+
+    async def stalls_handler(request):
+        """Event loop stalls of every worker"""
+        answers = await router.fan_out('GET', '/debug/stalls')
+        return web.json_response({str(index): response for index, (response, _) in answers.items()})
+
+
+    async def metrics_handler(request):
+        """The front's own metrics (each worker serves /metrics on its own port)"""
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+
+    def job_route(request):
+        """Worker and worker-side job ID from a front job ID ('<worker>.<id>')"""
+        index, _, job_id = request.match_info['job_id'].partition('.')
+        worker = next((w for w in router.workers if str(w.index) == index), None)
+        return (worker, job_id) if worker and job_id else (None, None)
+
+
+    async def job_handler(request):
+        """State and events of a job started with "async": true"""
+        worker, job_id = job_route(request)
+        if not worker:
+            return web.json_response({'error': 'Unknown job'}, status=404)
+        response, status = await router.call(worker, 'GET', f'/jobs/{job_id}')
+        if status == 200:
+            response = dict(response, id=request.match_info['job_id'])
+        return web.json_response(response, status=status)
+
+
+    async def job_events_handler(request):
+        """A job's Server-Sent Events, passed through from its worker"""
+        worker, job_id = job_route(request)
+        if not worker:
+            return web.json_response({'error': 'Unknown job'}, status=404)
+
+        session = router.clients[worker.index].session()
+        try:
+            upstream = await session.get(
+                f'{worker.url}/jobs/{job_id}/events', timeout=aiohttp.ClientTimeout(total=None)
+            )
+        except Exception as e:
+            return web.json_response({'error': f'Worker unreachable: {e}'}, status=502)
+
+        async with upstream:
+            if upstream.status != 200:
+                return web.json_response(
+                    await upstream.json(content_type=None), status=upstream.status
+                )
+            response = web.StreamResponse(headers={
+                'Content-Type': 'text/event-stream',
+                'Cache-Control': 'no-cache'
+            })
+            await response.prepare(request)
+            async for chunk in upstream.content.iter_any():
+                await response.write(chunk)
+        return response
+
+
+    # Add routes
+    app.router.add_post('/notify', notify_handler)
+    app.router.add_post('/stream', stream_handler)
+    app.router.add_post('/control', control_handler)
+    app.router.add_post('/batch', batch_handler)
+    app.router.add_get('/jobs/{job_id}', job_handler)
+    app.router.add_get('/jobs/{job_id}/events', job_events_handler)
+    app.router.add_post('/voice', voice_handler)
+    app.router.add_post('/voice/bulk', voice_bulk_handler)
+    app.router.add_get('/search', search_handler)
+    app.router.add_get('/status', status_handler)
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/debug/stalls', stalls_handler)
+
+    async def close_router(app):
+        await router.close()
+
+    app.on_cleanup.append(close_router)
+
+
+async def start_front(workers, shard_count, port):
+    """Start the front API on port; returns its runner"""
+    app = web.Application()
+    setup_front(app, Router(workers, shard_count))
+
+    runner = web.AppRunner(app, handler_cancellation=True)
+    await runner.setup()
+
+    site = TCPSite(runner, 'localhost', port)
+    await site.start()
+
+    logger.info(f"📢 Front API running on http://localhost:{port} ({len(workers)} workers)")
+    return runner
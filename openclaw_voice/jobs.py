@@ -0,0 +1,101 @@
+"""
+OpenClaw Voice - Jobs
+Requests that run in the background, followed by polling or as an event stream
+"""
+import asyncio
+import logging
+import time
+import uuid
+
+from .cache import LRUCache
+from .config import JOB_HISTORY
+
+logger = logging.getLogger(__name__)
+
+# Events after which a job never changes again
+TERMINAL_EVENTS = ('finished', 'failed')
+
+
+class Job:
+    """A notify / stream request and what has happened to it so far
+
+    Events (queued, resolved, connected, first_audio, finished, failed and
+    retrying) come from the queue item via emit(); each carries the seconds
+    since the job was accepted, so callers can see where the time goes.
+    """
+
+    def __init__(self, op):
+        self.id = uuid.uuid4().hex
+        self.op = op
+        self.state = 'accepted'
+        self.created = time.time()
+        self.events = []
+        self.result = None
+        self.error = None
+        self._started = time.monotonic()
+        self._listeners = set()
+
+    @property
+    def done(self):
+        return self.state in TERMINAL_EVENTS
+
+    def emit(self, event, **data):
+        """Record an event (on the bot loop); ignored once the job is done"""
+        if self.done:
+            return
+        entry = dict(data, event=event, elapsed=round(time.monotonic() - self._started, 3))
+        self.events.append(entry)
+        self.state = event
+        if event == 'failed':
+            self.error = data.get('error')
+        for queue in self._listeners:
+            queue.put_nowait(entry)
+
+    def subscribe(self):
+        """Events so far, and a queue that receives the ones after them"""
+        queue = asyncio.Queue()
+        self._listeners.add(queue)
+        return list(self.events), queue
+
+    def unsubscribe(self, queue):
+        self._listeners.discard(queue)
+
+    def describe(self):
+        return {
+            'id': self.id,
+            'op': self.op,
+            'state': self.state,
+            'created': self.created,
+            'events': self.events,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+jobs = LRUCache(JOB_HISTORY)
+
+
+def start(op, run):
+    """Create a job and run `await run(job)` -> (response, status) in the background"""
+    job = Job(op)
+    jobs.put(job.id, job)
+    asyncio.ensure_future(_run(job, run))
+    return job
+
+
+async def _run(job, run):
+    try:
+        response, status = await run(job)
+    except Exception as e:
+        logger.error(f"Job {job.id} error: {e}")
+        response, status = {'error': str(e)}, 500
+    job.result = response
+    if status >= 400:
+        job.emit('failed', error=response.get('error'))
+    elif job.state == 'accepted':
+        # Nothing was queued (e.g. a skip or stop), so it's done already
+        job.emit('finished')
+
+
+def get(job_id):
+    return jobs.get(job_id)
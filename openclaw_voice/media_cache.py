@@ -0,0 +1,151 @@
+"""
+OpenClaw Voice - Media Cache
+Often-played tracks kept on disk as Ogg Opus, so replays skip the network and ffmpeg
+"""
+import asyncio
+import logging
+import os
+import re
+
+from .cache import LRUCache
+from .config import (
+    DEFAULT_VOLUME, MEDIA_CACHE_DIR, MEDIA_CACHE_MB, MEDIA_CACHE_PLAYS, MEDIA_CACHE_MAX_SECONDS
+)
+from .tts import AudioCache
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+OGG_SUFFIX = '.ogg'
+
+# Tracks whose plays are counted, least recently played dropped first
+PLAY_COUNTS_KEPT = 10000
+
+# Downloads running at once, and how long one may take (seconds)
+DOWNLOAD_SLOTS = 2
+DOWNLOAD_TIMEOUT = 600
+
+RECONNECT_ARGS = ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+
+# Files named after the track (e.g. youtube-dQw4w9WgXcQ.ogg), so the
+# directory itself is the index; recency is in the file mtimes. Files are
+# stored at DEFAULT_VOLUME, and named for it unless it's 1.0
+# (youtube-dQw4w9WgXcQ-v80.ogg), so they play without any re-encoding
+files = AudioCache(MEDIA_CACHE_DIR, MEDIA_CACHE_MB * 2**20, suffix=OGG_SUFFIX)
+plays = LRUCache(PLAY_COUNTS_KEPT)
+_downloading = {}  # key -> task
+_slots = None
+
+
+def track_key(info):
+    """Cache key for resolved stream info: '<extractor>-<video ID>' (None if unknown)"""
+    if not info.get('id') or not info.get('extractor'):
+        return None
+    return re.sub(r'[^A-Za-z0-9_-]', '_', f"{info['extractor']}-{info['id']}")
+
+
+def cacheable(info):
+    """Whether a track may be kept: a known, finite length under the limit"""
+    duration = info.get('duration')
+    return MEDIA_CACHE_MB > 0 and bool(duration) and duration <= MEDIA_CACHE_MAX_SECONDS
+
+
+async def play(info):
+    """Count a play of a track; path of its cached file (None if not cached yet)
+
+    The play that reaches MEDIA_CACHE_PLAYS starts a background download;
+    it still streams, the ones after it play from disk.
+    """
+    key = track_key(info)
+    if key is None or not cacheable(info):
+        return None
+    if DEFAULT_VOLUME != 1.0:
+        key += f'-v{round(DEFAULT_VOLUME * 100)}'
+    # The first lookup scans the directory, later ones touch the file
+    path = await asyncio.get_running_loop().run_in_executor(None, files.get, key)
+    if path:
+        return path
+
+    count = (plays.get(key) or 0) + 1
+    plays.put(key, count)
+    if count >= MEDIA_CACHE_PLAYS and key not in _downloading and info.get('url'):
+        _downloading[key] = asyncio.ensure_future(_download(key, info))
+    return None
+
+
+async def _download(key, info):
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(DOWNLOAD_SLOTS)
+    try:
+        async with _slots:
+            path, size = await _store(key, info)
+        plays.pop(key)
+        logger.info(f"Cached {info.get('title') or key} ({size // 1024} KB)")
+    except Exception as e:
+        metrics.errors_total.inc(stage='media_cache')
+        logger.warning(f"Could not cache {info.get('title') or key}: {e}")
+    finally:
+        _downloading.pop(key, None)
+
+
+def _adopt(key, tmp_path):
+    """Move a finished download into place: (path, size)"""
+    size = os.path.getsize(tmp_path)
+    if not size:
+        raise RuntimeError("ffmpeg wrote nothing")
+    return files.adopt(key, tmp_path), size
+
+
+async def _store(key, info):
+    """Fetch the stream into an Ogg Opus file at DEFAULT_VOLUME: (path, size)
+
+    Only repackaged if it's Opus already and the volume is 1.0.
+    """
+    if (info.get('acodec') or '').startswith('opus') and DEFAULT_VOLUME == 1.0:
+        codec = ['-c:a', 'copy']
+    else:
+        codec = ['-c:a', 'libopus', '-b:a', '128k', '-ar', '48000', '-ac', '2', '-frame_duration', '20']
+        if DEFAULT_VOLUME != 1.0:
+            codec += ['-filter:a', f'volume={DEFAULT_VOLUME}']
+    loop = asyncio.get_running_loop()
+    fd, tmp_path = await loop.run_in_executor(None, files.temp_file)
+    os.close(fd)
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-loglevel', 'error', '-y', *RECONNECT_ARGS, '-i', info['url'],
+            '-vn', '-map_metadata', '-1', *codec, '-f', 'ogg', tmp_path,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        metrics.ffmpeg_processes.inc(use='media_cache')
+        try:
+            _, err = await asyncio.wait_for(proc.communicate(), DOWNLOAD_TIMEOUT)
+        except BaseException:
+            proc.kill()
+            await proc.wait()
+            raise
+        finally:
+            metrics.ffmpeg_processes.dec(use='media_cache')
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {err.decode(errors='replace').strip()[-200:]}")
+        return await loop.run_in_executor(None, _adopt, key, tmp_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@metrics.collector
+def _collect_metrics():
+    stats = files.stats()
+    metrics.cache_entries.set(stats['entries'], cache='media')
+    metrics.cache_bytes.set(stats['bytes'], cache='media')
+
+
+def stats():
+    """Cache counters for /status"""
+    return dict(files.stats(), counted_tracks=len(plays), downloading=len(_downloading))
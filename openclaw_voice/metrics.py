@@ -0,0 +1,194 @@
+"""
+OpenClaw Voice - Metrics
+Counters, gauges and histograms, served in Prometheus text format at /metrics
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds), from cache hits up to slow yt-dlp runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def _pairs(self, key):
+        return list(zip(self.labels, key))
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, self._pairs(key), value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, pairs, value in self.samples():
+            lines.append(f'{name}{_format_labels(pairs)} {value:g}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+    def clear(self):
+        self._values.clear()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block takes (also when it raises)"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self._values.items()):
+            pairs = self._pairs(key)
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket', pairs + [('le', f'{bound:g}')], cumulative
+            yield f'{self.name}_bucket', pairs + [('le', '+Inf')], count
+            yield f'{self.name}_sum', pairs, total
+            yield f'{self.name}_count', pairs, count
+
+
+def collector(func):
+    """Register func() to update gauges right before each scrape"""
+    _collectors.append(func)
+    return func
+
+
+def render():
+    """All metrics in Prometheus text format"""
+    for func in _collectors:
+        try:
+            func()
+        except Exception as e:
+            logger.warning(f"Metrics collector failed: {e}")
+    return '\n'.join(metric.render() for metric in registry) + '\n'
+
+
+# Latency
+resolve_seconds = Histogram(
+    'openclaw_resolve_seconds', 'yt-dlp resolve/search time, cache misses only', ['kind']
+)
+tts_seconds = Histogram(
+    'openclaw_tts_seconds', 'Speech synthesis time, cache misses only', ['engine']
+)
+connect_seconds = Histogram(
+    'openclaw_voice_connect_seconds', 'Voice connection handshake time'
+)
+first_audio_seconds = Histogram(
+    'openclaw_time_to_first_audio_seconds', 'From queueing an item to its first audio frame',
+    ['lane']
+)
+request_seconds = Histogram(
+    'openclaw_http_request_seconds', 'HTTP API handler time', ['endpoint']
+)
+command_seconds = Histogram(
+    'openclaw_command_seconds', 'Slash command time, from the interaction to completion',
+    ['command']
+)
+loop_lag_seconds = Histogram(
+    'openclaw_event_loop_lag_seconds', 'Delay before the event loop ran a scheduled callback',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+# Counts
+requests_total = Counter(
+    'openclaw_http_requests_total', 'HTTP API requests', ['endpoint', 'status']
+)
+commands_total = Counter(
+    'openclaw_commands_total', 'Slash commands run', ['command', 'result']
+)
+errors_total = Counter(
+    'openclaw_errors_total', 'Errors by pipeline stage', ['stage']
+)
+loop_stalls_total = Counter(
+    'openclaw_event_loop_stalls_total', 'Times the event loop was blocked past LOOP_STALL_MS'
+)
+
+# Current state (updated by collectors)
+ffmpeg_processes = Gauge(
+    'openclaw_ffmpeg_processes', 'Running ffmpeg processes', ['use']
+)
+queue_depth = Gauge(
+    'openclaw_queue_depth', 'Items waiting in queues, all guilds', ['lane']
+)
+sessions_gauge = Gauge(
+    'openclaw_voice_sessions', 'Voice sessions by state', ['state']
+)
+broadcast_listeners = Gauge(
+    'openclaw_broadcast_listeners', 'Guilds listening to a shared broadcast'
+)
+cache_entries = Gauge(
+    'openclaw_cache_entries', 'Entries in each cache', ['cache']
+)
+cache_bytes = Gauge(
+    'openclaw_cache_bytes', 'Bytes on disk in each disk cache', ['cache']
+)
@@ -0,0 +1,209 @@
+"""
+OpenClaw Voice - Mixer
+Mixes several audio sources per guild into one stream, ducking music under speech
+"""
+import logging
+import threading
+
+import numpy as np
+import discord
+
+from .sources import FRAME_SIZE, FRAME_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Samples per channel in one frame
+FRAME_SAMPLES = FRAME_SIZE // 4
+
+
+class MixerInput:
+    """One source playing through a Mixer"""
+
+    def __init__(self, source, gain, ducked, after, started=None):
+        self.source = source
+        self.gain = gain
+        self.ducked = ducked
+        self.after = after
+        self.started = started
+        self.removed = False
+        self.opus = source.is_opus()
+        self._decoder = None
+        self._pcm = bytearray()  # Decoded audio not mixed yet
+
+    def read_pcm(self):
+        """Next 20 ms of PCM, decoding Opus packets if the source sends them"""
+        if not self.opus:
+            return self.source.read()
+        if self._decoder is None:
+            self._decoder = discord.opus.Decoder()
+        while len(self._pcm) < FRAME_SIZE:
+            packet = self.source.read()
+            if not packet:
+                break
+            self._pcm += self._decoder.decode(packet)
+        frame = bytes(self._pcm[:FRAME_SIZE])
+        del self._pcm[:FRAME_SIZE]
+        return frame
+
+    def _started(self):
+        """First audio from this input is going out
+
+        Sources that pad with silence while they wait (PCMStream, broadcast
+        listeners) say when real audio has gone out with an audible flag.
+        """
+        if not self.started or not getattr(self.source, 'audible', True):
+            return
+        started, self.started = self.started, None
+        try:
+            started()
+        except Exception as e:
+            logger.error(f"Mixer input callback failed: {e}")
+
+    def stop(self):
+        """Drop out of the mix; after() runs from the audio thread"""
+        self.removed = True
+
+
+class Mixer(discord.AudioSource):
+    """Sum PCM inputs into 20 ms frames, with per-input gain and ducking
+
+    While any un-ducked input (speech) is playing, ducked inputs (music)
+    ramp down to duck_gain over attack seconds, and back up over release
+    seconds once it's done. Gain and envelope are applied to whole frames
+    with NumPy, and the sum is clipped to int16.
+
+    A lone Opus input at full volume is passed through as-is, so discord.py
+    sends its packets without decoding or encoding anything. Once another
+    input joins, Opus inputs are decoded and mixed like the rest.
+
+    The mixer ends (read() returns b'') once it runs out of inputs; after
+    that add() returns None and a new Mixer is needed.
+    """
+
+    def __init__(self, duck_gain=0.25, attack=0.15, release=0.6):
+        self.duck_gain = duck_gain
+        self._attack_step = FRAME_SECONDS / attack if attack > 0 else 1.0
+        self._release_step = FRAME_SECONDS / release if release > 0 else 1.0
+        self._envelope = 1.0
+        self._inputs = []
+        self._lock = threading.Lock()
+        self._opus = False  # What the last read() returned
+        self.ended = False
+
+    def add(self, source, gain=1.0, ducked=True, after=None, started=None):
+        """Start mixing in a source; after(error) runs when it ends
+
+        started() runs once its first frame goes out. Both are called from
+        the audio thread.
+        """
+        with self._lock:
+            if self.ended:
+                return None
+            mixer_input = MixerInput(source, gain, ducked, after, started)
+            self._inputs.append(mixer_input)
+            return mixer_input
+
+    def is_opus(self):
+        # discord.py asks after every read()
+        return self._opus
+
+    def _passthrough(self, inputs):
+        """The input whose packets can go out untouched, if any"""
+        if len(inputs) != 1 or self._envelope != 1.0:
+            return None
+        mixer_input = inputs[0]
+        if mixer_input.opus and mixer_input.gain == 1.0 and not mixer_input.removed \
+                and not mixer_input._pcm:
+            return mixer_input
+        return None
+
+    def _next_envelope(self, speaking):
+        """Move the music envelope one frame toward its target"""
+        start = self._envelope
+        if speaking:
+            end = max(self.duck_gain, start - self._attack_step)
+        else:
+            end = min(1.0, start + self._release_step)
+        self._envelope = end
+        if start == end:
+            return start
+        # Per-sample ramp across the frame, one value per stereo pair
+        return np.repeat(np.linspace(start, end, FRAME_SAMPLES, dtype=np.float32), 2)
+
+    def read(self):
+        with self._lock:
+            inputs = list(self._inputs)
+            if not inputs:
+                self.ended = True
+                return b''
+
+        passthrough = self._passthrough(inputs)
+        if passthrough:
+            try:
+                packet = passthrough.source.read()
+            except Exception as e:
+                self._finish(passthrough, e)
+                return self.read()
+            if packet:
+                self._opus = True
+                passthrough._started()
+                return packet
+            self._finish(passthrough)
+            return self.read()
+        self._opus = False
+
+        speaking = any(not i.ducked and not i.removed for i in inputs)
+        envelope = self._next_envelope(speaking)
+
+        mix = np.zeros(FRAME_SIZE // 2, dtype=np.float32)
+        finished = []
+        for mixer_input in inputs:
+            if mixer_input.removed:
+                finished.append((mixer_input, None))
+                continue
+            try:
+                data = mixer_input.read_pcm()
+            except Exception as e:
+                finished.append((mixer_input, e))
+                continue
+            if not data:
+                finished.append((mixer_input, None))
+                continue
+            mixer_input._started()
+            if len(data) < FRAME_SIZE:
+                data = data.ljust(FRAME_SIZE, b'\0')
+            samples = np.frombuffer(data, dtype=np.int16)
+            if mixer_input.ducked:
+                mix += samples * (envelope * mixer_input.gain)
+            else:
+                mix += samples * mixer_input.gain
+
+        for mixer_input, error in finished:
+            self._finish(mixer_input, error)
+
+        np.clip(mix, -32768, 32767, out=mix)
+        return mix.astype(np.int16).tobytes()
+
+    def _finish(self, mixer_input, error=None):
+        with self._lock:
+            if mixer_input not in self._inputs:
+                return
+            self._inputs.remove(mixer_input)
+        # after() first, like discord.py's AudioPlayer: it may still look at
+        # the source (e.g. how its ffmpeg exited), which cleanup() tears down
+        if mixer_input.after:
+            try:
+                mixer_input.after(error)
+            except Exception as e:
+                logger.error(f"Mixer input callback failed: {e}")
+        try:
+            mixer_input.source.cleanup()
+        except Exception as e:
+            logger.warning(f"Source cleanup failed: {e}")
+
+    def cleanup(self):
+        with self._lock:
+            self.ended = True
+            inputs = list(self._inputs)
+        for mixer_input in inputs:
+            self._finish(mixer_input)
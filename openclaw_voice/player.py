@@ -3,132 +3,511 @@ OpenClaw Voice - Audio Player
 Handles all audio playback: streams, TTS, etc.
 """
 import asyncio
-import os
-import tempfile
+import io
+import time
 import logging
-import subprocess
+from itertools import islice
 import discord
 
-from .config import DEFAULT_VOLUME, should_respond
+from .config import (
+    DEFAULT_VOLUME, TTS_STREAMING, QUEUE_PREFETCH, OPUS_PASSTHROUGH,
+    PLAYLIST_PAGE_SIZE, PLAYLIST_MAX_ENTRIES, BROADCAST_LIVE, should_respond
+)
+from . import broadcast
+from . import media_cache
+from . import metrics
+from . import resolver
+from . import tts
+from .session import sessions, get_session, connection_stats
+from .sources import PCMStream, OggOpusFile, ffmpeg_failed
 
 logger = logging.getLogger(__name__)
 
-# Voice client storage
-voice_clients = {}
+# Playback that dies on its own this quickly (seconds) is treated as a dead
+# stream URL - typically a cached googlevideo URL answering 403
+STALE_URL_WINDOW = 3.0
 
+# ffmpeg input options for network streams
+RECONNECT_OPTIONS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
 
-async def disconnect(guild_id):
-    """Disconnect voice client for a guild"""
-    try:
-        if guild_id in voice_clients:
+
+def _upstream(source):
+    """What produces a source's audio: for a broadcast listener, the shared source"""
+    return source.broadcast.source if isinstance(source, broadcast.Listener) else source
+
+
+def _stream_failed(source):
+    """Check if the ffmpeg behind a stream exited with an error by itself"""
+    if isinstance(source, broadcast.Listener):
+        # The broadcast has cleaned up its ffmpeg by now; it kept the verdict
+        return source.broadcast.failed
+    return ffmpeg_failed(source)
+
+
+class QueueItem:
+    """Something waiting to play: a stream URL ('url') or a TTS message ('tts')
+
+    A 'playlist' item stands for one page of a playlist: when its turn
+    comes it's replaced by that page's entries (plus an item for the next
+    page), so only the part of a playlist that gets played is ever read.
+    """
+
+    def __init__(self, kind, voice_channel, target, on_event=None, **options):
+        self.kind = kind
+        self.voice_channel = voice_channel
+        self.guild_id = voice_channel.guild.id
+        self.target = target
+        self.options = options
+        self.title = options.get('title') or target[:80]
+        self.lane = 'speech' if kind == 'tts' else 'music'
+        self.input = None  # MixerInput while playing
+        self.on_event = on_event  # on_event(event, **data) - lifecycle events, see jobs
+        self.created = time.monotonic()
+        self.state = 'queued'  # -> playing -> done, or failed
+        self.error = None
+        self._prepared = None
+        self._feeder = None
+
+    def emit(self, event, **data):
+        """Report a lifecycle event (queued, resolved, connected, first_audio, ...)"""
+        if self.on_event:
             try:
-                await voice_clients[guild_id].disconnect()
+                self.on_event(event, **data)
             except Exception as e:
-                logger.warning(f"Disconnect error: {e}")
-            finally:
-                del voice_clients[guild_id]
-    except KeyError:
-        pass  # Already disconnected
-
-
-async def play_url(voice_channel, url, guild_id):
-    """Play a URL in a voice channel"""
-    await disconnect(guild_id)
-    
-    # Get direct stream URL if it's a YouTube URL
-    stream_url = url
-    if 'youtube.com' in url or 'youtu.be' in url:
-        try:
-            result = subprocess.run(
-                ['yt-dlp', '-f', 'bestaudio', '--get-url', url],
-                capture_output=True, text=True, timeout=30
+                logger.warning(f"Event listener failed: {e}")
+
+    def prepare(self):
+        """Start resolving / synthesizing in the background (only once)"""
+        if self._prepared is None:
+            self._prepared = asyncio.ensure_future(self._prepare())
+        return self._prepared
+
+    async def _prepare(self):
+        if self.kind == 'playlist':
+            start = self.options.get('start', 1)
+            count = min(PLAYLIST_PAGE_SIZE, PLAYLIST_MAX_ENTRIES - start + 1)
+            entries = await resolver.playlist(self.target, start, count, self.guild_id)
+            self.emit('resolved', entries=len(entries), start=start)
+            return entries
+
+        if self.kind == 'url':
+            info = await _resolve_stream(self.target, self.guild_id)  # Stream info
+            self.emit('resolved', codec=info.get('acodec'))
+            return info
+
+        lang = self.options.get('lang', 'en')
+        engine = self.options.get('engine')
+        voice = self.options.get('voice')
+        sentences = tts.split_sentences(self.target) if TTS_STREAMING else [self.target]
+        if len(sentences) > 1:
+            # Pipelined: start speaking as soon as the first sentence is ready
+            stream = PCMStream()
+            self._feeder = asyncio.ensure_future(
+                tts.feed_sentences(stream, sentences, lang, engine, voice)
             )
-            stream_url = result.stdout.strip().split('\n')[0]
-            if not stream_url.startswith('http'):
-                logger.warning(f"Could not get stream URL, trying direct: {stream_url}")
-                stream_url = url  # Fallback
-        except Exception as e:
-            logger.warning(f"Failed to get stream URL: {e}")
-            stream_url = url
-    
-    vc = await voice_channel.connect()
-    voice_clients[guild_id] = vc
-    
-    source = discord.FFmpegPCMAudio(
-        stream_url,
-        options="-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+            self.emit('resolved', sentences=len(sentences))
+            return stream
+        # Cached PCM, synthesized first if it's new text
+        pcm = await tts.synthesize_pcm(self.target, lang, engine, voice)
+        self.emit('resolved', sentences=1)
+        return pcm
+
+    async def source(self, prepared):
+        """Build the audio source from what prepare() produced"""
+        if self.kind == 'url':
+            if self.options.get('broadcast') or (BROADCAST_LIVE and prepared.get('is_live')):
+                # Shared with every guild playing the same thing
+                key = media_cache.track_key(prepared) or prepared['url']
+                return broadcast.subscribe(key, lambda: _stream_source(prepared))
+            path = await media_cache.play(prepared)
+            return OggOpusFile(path) if path else _stream_source(prepared)
+        if isinstance(prepared, PCMStream):
+            return prepared
+        return discord.PCMAudio(io.BytesIO(prepared))
+
+    def discard(self):
+        """Drop any background work for an item that won't (or no longer) play"""
+        if self._prepared and not self._prepared.done():
+            self._prepared.cancel()
+        if self._feeder:
+            self._feeder.cancel()
+
+    def describe(self):
+        return {
+            'kind': self.kind,
+            'title': self.title,
+            'channel_id': str(self.voice_channel.id),
+        }
+
+
+async def _resolve_stream(url, guild_id):
+    """Stream info ('url', 'acodec') for a page URL (YouTube), or the URL itself"""
+    if 'youtube.com' not in url and 'youtu.be' not in url:
+        # Possibly a stream URL we resolved earlier, e.g. by /play
+        return resolver.lookup(url) or {'url': url}
+    try:
+        info = await resolver.resolve(url, guild_id)
+        if info and (info.get('url') or '').startswith('http'):
+            return info
+        logger.warning(f"Could not get stream URL, trying direct: {url}")
+    except Exception as e:
+        logger.warning(f"Failed to get stream URL: {e}")
+    return {'url': url}  # Fallback
+
+
+def _stream_source(info):
+    """ffmpeg source for a stream, Opus-native unless OPUS_PASSTHROUGH is off"""
+    url = info['url']
+    if not OPUS_PASSTHROUGH:
+        return discord.FFmpegPCMAudio(url, before_options=RECONNECT_OPTIONS)
+    if (info.get('acodec') or '').startswith('opus') and DEFAULT_VOLUME == 1.0:
+        # Already Opus - only repackaged, never decoded
+        return discord.FFmpegOpusAudio(url, codec='copy', before_options=RECONNECT_OPTIONS)
+    # Volume applied and Opus encoded once, inside ffmpeg
+    return discord.FFmpegOpusAudio(
+        url, before_options=RECONNECT_OPTIONS, options=f"-filter:a volume={DEFAULT_VOLUME}"
     )
-    source = discord.PCMVolumeTransformer(source)
-    source.volume = DEFAULT_VOLUME
-    
+
+
+async def disconnect(guild_id):
+    """Stop playback, clear the queue and disconnect voice client for a guild"""
+    session = sessions.get(guild_id)
+    if session:
+        await session.disconnect()
+
+
+async def connect(voice_channel, guild_id):
+    """Get a voice client in voice_channel, reusing the guild's connection"""
+    return await get_session(guild_id).connect(voice_channel)
+
+
+def schedule_idle(guild_id):
+    """Disconnect the guild after VOICE_IDLE_TIMEOUT unless it gets used again"""
+    session = sessions.get(guild_id)
+    if session:
+        session.schedule_idle()
+
+
+def _prefetch(lane):
+    """Resolve / synthesize the next items while the current one plays"""
+    for item in islice(lane.items, QUEUE_PREFETCH):
+        item.prepare()
+
+
+def _expand(item, entries):
+    """Queue items for a playlist page's entries, and one for the next page"""
+    start = item.options.get('start', 1)
+    full_page = len(entries) >= PLAYLIST_PAGE_SIZE
+    first = item.options.get('first')
+    if first and start == 1:
+        # A watch?v=...&list=... URL plays from its video: from there if it's
+        # on the first page, otherwise that video first, then the playlist
+        ids = [entry.get('id') for entry in entries]
+        if first in ids:
+            entries = entries[ids.index(first):]
+        else:
+            entries = [{'url': f'https://www.youtube.com/watch?v={first}'}, *entries]
+
+    # The playlist's job (if any) follows its first entry
+    on_event = item.on_event if start == 1 else None
+    items = []
+    for entry in entries:
+        url = entry.get('url') or entry.get('webpage_url')
+        if url:
+            items.append(QueueItem(
+                'url', item.voice_channel, url, on_event=on_event, title=entry.get('title'),
+                broadcast=item.options.get('broadcast')
+            ))
+            on_event = None
+
+    next_start = start + PLAYLIST_PAGE_SIZE
+    if full_page and next_start <= PLAYLIST_MAX_ENTRIES:
+        items.append(QueueItem('playlist', item.voice_channel, item.target, title=item.title,
+                               start=next_start, broadcast=item.options.get('broadcast')))
+    return items
+
+
+async def _play_next(session, lane):
+    """Start the lane's next queued item, skipping over items that fail"""
+    async with lane.lock:
+        if lane.current is not None:
+            return  # Someone else already started the next item
+        while lane.items:
+            item = lane.items.popleft()
+            if item.kind == 'playlist':
+                try:
+                    items = _expand(item, await item.prepare())
+                    if not items and item.options.get('start', 1) == 1:
+                        raise resolver.ResolverError('Playlist is empty')
+                except Exception as e:
+                    logger.error(f"Playlist error: {e}")
+                    item.state, item.error = 'failed', e
+                    item.emit('failed', error=str(e))
+                    metrics.errors_total.inc(stage='playback')
+                    continue
+                item.state = 'done'
+                lane.items.extendleft(reversed(items))
+                continue
+            lane.current = item
+            try:
+                await _start(session, lane, item)
+            except Exception as e:
+                logger.error(f"Playback error: {e}")
+                item.discard()
+                item.state, item.error = 'failed', e
+                item.emit('failed', error=str(e))
+                metrics.errors_total.inc(stage='playback')
+                if lane.current is item:
+                    lane.current = None
+                continue
+            except asyncio.CancelledError:
+                if lane.current is not item and item.prepare().cancelled():
+                    # Skipped or replaced while resolving - move on
+                    item.state = 'done'
+                    item.emit('finished')
+                    continue
+                # Cancelled (shutting down) - don't leave the lane stuck on it
+                item.discard()
+                item.state = 'failed'
+                item.emit('failed', error='Cancelled')
+                if lane.current is item:
+                    lane.current = None
+                raise
+            item.state = 'playing'
+            _prefetch(lane)
+            return
+
+        if session.lanes_idle():
+            session.schedule_idle()
+
+
+async def _start(session, lane, item):
+    if session.vc and session.vc.is_playing():
+        # Keep the mix going until the new item is ready
+        prepared = await item.prepare()
+        await session.connect(item.voice_channel)
+    else:
+        prepared, _ = await asyncio.gather(item.prepare(), session.connect(item.voice_channel))
+    item.emit('connected', channel_id=str(session.vc.channel.id))
+
+    source = await item.source(prepared)
+    started = time.monotonic()
+
     def after_playing(error):
+        # Runs on the audio thread
         if error:
             logger.error(f"Playback error: {error}")
-        # Schedule disconnect in bot's event loop
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(disconnect(guild_id))
-            loop.close()
-        except Exception as e:
-            logger.warning(f"Auto-disconnect failed: {e}")
-    
-    vc.play(source, after=after_playing)
-    return vc
-
-
-async def play_tts(voice_channel, text, guild_id, lang='en'):
-    """Generate and play TTS in a voice channel"""
-    await disconnect(guild_id)
-    
-    vc = await voice_channel.connect()
-    voice_clients[guild_id] = vc
-    
-    # Generate TTS
-    from gtts import gTTS
-    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
-        tts = gTTS(text=text, lang=lang)
-        tts.save(f.name)
-        temp_file = f.name
-    
-    source = discord.FFmpegPCMAudio(temp_file)
-    source = discord.PCMVolumeTransformer(source)
-    source.volume = DEFAULT_VOLUME
-    
-    def after_playing(error):
-        if error:
-            logger.error(f"TTS error: {error}")
-        # Clean up temp file
-        try:
-            os.unlink(temp_file)
-        except:
-            pass
-        # Schedule disconnect in bot's event loop
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(disconnect(guild_id))
-            loop.close()
-        except Exception as e:
-            logger.warning(f"Auto-disconnect failed: {e}")
-    
-    vc.play(source, after=after_playing)
-    return vc
-
-
-async def search_youtube(query, max_results=10):
+        stopped = item.input is not None and item.input.removed
+        stale = (
+            not error and not stopped and item.kind == 'url'
+            and item.options.get('retry_stale', True)
+            and time.monotonic() - started < STALE_URL_WINDOW and _stream_failed(source)
+        )
+        stale_url = prepared['url'] if stale else None
+        session.report(_finished(session, lane, item, stale_url))
+
+    # ffmpeg's Opus and cached files already have the volume applied; the
+    # mixer applies it to the rest
+    opus_at_volume = isinstance(_upstream(source), (discord.FFmpegOpusAudio, OggOpusFile))
+    gain = 1.0 if opus_at_volume else DEFAULT_VOLUME
+    item.input = session.mix(
+        source, gain, ducked=lane.name == 'music', after=after_playing,
+        started=lambda: session.loop.call_soon_threadsafe(_first_audio, item)
+    )
+
+    for replaced in lane.replaced:
+        if replaced.input:
+            replaced.input.stop()
+    lane.replaced.clear()
+    if lane.current is not item:
+        item.input.stop()  # Skipped or replaced while it was starting
+
+
+def _first_audio(item):
+    metrics.first_audio_seconds.observe(time.monotonic() - item.created, lane=item.lane)
+    item.emit('first_audio')
+
+
+async def _finished(session, lane, item, stale_url=None):
+    """An item stopped playing (ended, skipped or replaced)"""
+    item.discard()
+    item.state = 'done'
+    retry = None
+    if lane.current is item:
+        lane.current = None
+
+        if stale_url:
+            # Playback died right away - most likely a cached URL answering 403
+            origin = resolver.invalidate(stale_url)
+            if origin is None and item.target != stale_url:
+                # Already invalidated, e.g. by another guild on the same broadcast
+                origin = item.target
+            if origin:
+                logger.info(f"Cached stream URL is dead, re-resolving: {origin[:50]}")
+                retry = QueueItem(
+                    'url', item.voice_channel, origin, on_event=item.on_event,
+                    title=item.title, retry_stale=False, broadcast=item.options.get('broadcast')
+                )
+                lane.items.appendleft(retry)
+
+    item.emit('retrying' if retry else 'finished')
+
+    # No-op if something else has already taken over
+    await _play_next(session, lane)
+
+
+async def enqueue(item, now=False):
+    """Queue an item in its lane and return its position (0 = playing now)
+
+    URLs go to the music lane and TTS to the speech lane, which plays over
+    the music (ducking it). With now=True the item jumps its lane's queue
+    and replaces what the lane is playing. Raises if an item that starts
+    right away fails to start.
+    """
+    session = get_session(item.guild_id)
+    lane = session.lanes[item.lane]
+    if now:
+        lane.items.appendleft(item)
+    else:
+        lane.items.append(item)
+    item.emit('queued', lane=item.lane)
+
+    if now or lane.current is None:
+        if lane.current:
+            # Keeps playing until the new item starts; its after-callback
+            # will then see it has been replaced
+            lane.current.discard()
+            lane.replaced.append(lane.current)
+            lane.current = None
+        # Shielded: a caller that goes away (e.g. an HTTP client disconnecting)
+        # mustn't abort the start halfway
+        await asyncio.shield(_play_next(session, lane))
+        if item.state == 'failed':
+            raise item.error
+        if item.state != 'queued':
+            return 0
+    else:
+        _prefetch(lane)
+
+    return lane.items.index(item) + 1 if item in lane.items else 0
+
+
+async def enqueue_url(voice_channel, url, guild_id, now=False, **options):
+    """Queue a URL for a voice channel, see enqueue()
+
+    A playlist or mix URL queues its entries, read a page at a time as
+    playback gets to them.
+    """
+    if resolver.playlist_id(url) and PLAYLIST_MAX_ENTRIES > 0:
+        item = QueueItem('playlist', voice_channel, url, first=resolver.video_id(url), **options)
+    else:
+        item = QueueItem('url', voice_channel, url, **options)
+    return await enqueue(item, now)
+
+
+async def enqueue_tts(voice_channel, text, guild_id, lang='en', engine=None, voice=None, now=False,
+                      on_event=None):
+    """Queue a TTS message for a voice channel, see enqueue()"""
+    item = QueueItem(
+        'tts', voice_channel, text, on_event=on_event, lang=lang, engine=engine, voice=voice
+    )
+    return await enqueue(item, now)
+
+
+async def play_url(voice_channel, url, guild_id, broadcast=False):
+    """Play a URL in a voice channel right away
+
+    With broadcast=True, guilds playing the same URL share one upstream.
+    """
+    await enqueue_url(voice_channel, url, guild_id, now=True, broadcast=broadcast)
+    return get_voice_client(guild_id)
+
+
+async def play_tts(voice_channel, text, guild_id, lang='en', engine=None, voice=None):
+    """Generate and play TTS in a voice channel right away (engine defaults to TTS_ENGINE)"""
+    await enqueue_tts(voice_channel, text, guild_id, lang, engine, voice, now=True)
+    return get_voice_client(guild_id)
+
+
+def skip(guild_id, lane='music'):
+    """Skip a lane's current item; returns what was skipped (or None)
+
+    With nothing playing in the music lane, skips the current speech.
+    """
+    session = sessions.get(guild_id)
+    if not session:
+        return None
+    current = session.lanes[lane].current
+    if current is None and lane == 'music':
+        lane = 'speech'
+        current = session.lanes[lane].current
+    if current is None:
+        return None
+    if current.input:
+        current.input.stop()  # The after-callback moves on to the next item
+    else:
+        # Still starting - _start() stops it once it's in the mix, or
+        # _play_next() moves on if its resolve was still running
+        session.lanes[lane].current = None
+        current.discard()
+    return current.describe()
+
+
+def clear(guild_id):
+    """Drop everything queued after the current items; returns how many"""
+    session = sessions.get(guild_id)
+    return session.clear() if session else 0
+
+
+def _describe_lane(lane):
+    return {
+        'current': lane.current.describe() if lane and lane.current else None,
+        'queued': [item.describe() for item in lane.items] if lane else [],
+    }
+
+
+def list_queue(guild_id):
+    """The current music item and what's queued after it, plus the speech lane"""
+    session = sessions.get(guild_id)
+    music = _describe_lane(session.lanes['music'] if session else None)
+    music['speech'] = _describe_lane(session.lanes['speech'] if session else None)
+    return music
+
+
+@metrics.collector
+def _collect_metrics():
+    depths = {lane: 0 for lane in ('music', 'speech')}
+    streams = 0
+    metrics.sessions_gauge.clear()
+    for session in sessions.values():
+        metrics.sessions_gauge.inc(state=session.state)
+        for lane in session.lanes.values():
+            depths[lane.name] += len(lane.items)
+            for item in [lane.current, *lane.replaced]:
+                if (item and item.kind == 'url' and item.input and not item.input.removed
+                        and not isinstance(item.input.source, (OggOpusFile, broadcast.Listener))):
+                    streams += 1
+    for lane, depth in depths.items():
+        metrics.queue_depth.set(depth, lane=lane)
+    metrics.ffmpeg_processes.set(streams, use='stream')
+    metrics.ffmpeg_processes.set(broadcast.count(), use='broadcast')
+
+
+def session_stats():
+    """Connection counters and how many sessions are in each state"""
+    states = {}
+    for session in sessions.values():
+        states[session.state] = states.get(session.state, 0) + 1
+    return dict(connection_stats, states=states)
+
+
+async def search_youtube(query, max_results=10, guild_id=None):
     """Search YouTube for streams"""
     try:
-        result = subprocess.run(
-            ['yt-dlp', '--flat-playlist', '-J', f'ytsearch{max_results}:{query}'],
-            capture_output=True, text=True, timeout=30
-        )
-        
-        import json
-        data = json.loads(result.stdout)
+        data = await resolver.search(query, max_results, guild_id)
         entries = []
         
-        for entry in data.get('entries', []):
+        for entry in data:
             entries.append({
                 'title': entry.get('title', 'Unknown'),
                 'url': entry.get('url', ''),
@@ -143,16 +522,10 @@ async def search_youtube(query, max_results=10):
         return []
 
 
-async def get_stream_url(query):
+async def get_stream_url(query, guild_id=None):
     """Get direct stream URL for a query"""
     try:
-        result = subprocess.run(
-            ['yt-dlp', '-f', 'bestaudio', '--get-url', f'ytsearch1:{query}'],
-            capture_output=True, text=True, timeout=30
-        )
-        
-        url = result.stdout.strip().split('\n')[0]
-        return url if url.startswith('http') else None
+        return await resolver.get_url(f'ytsearch1:{query}', guild_id)
         
     except Exception as e:
         logger.error(f"Stream URL error: {e}")
@@ -161,10 +534,11 @@ async def get_stream_url(query):
 
 def get_voice_client(guild_id):
     """Get voice client for a guild"""
-    return voice_clients.get(guild_id)
+    session = sessions.get(guild_id)
+    return session.vc if session else None
 
 
 def is_playing(guild_id):
     """Check if something is playing"""
-    vc = voice_clients.get(guild_id)
+    vc = get_voice_client(guild_id)
     return vc and vc.is_playing()
@@ -0,0 +1,309 @@
+"""
+OpenClaw Voice - Resolver
+Runs yt-dlp lookups off the event loop, with concurrency caps and deadlines
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse, parse_qs
+
+from .config import (
+    RESOLVER_CONCURRENCY, RESOLVER_GUILD_CONCURRENCY, RESOLVER_TIMEOUT,
+    EXTRACTOR_WORKERS, EXTRACTOR_MAX_JOBS, EXTRACTOR_MAX_RSS_MB,
+    URL_CACHE_SIZE, URL_CACHE_TTL, URL_CACHE_MARGIN,
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+)
+from . import extractor
+from . import metrics
+from .cache import LRUCache, SingleFlight
+from .extractor import ExtractorError
+
+logger = logging.getLogger(__name__)
+
+# Created lazily so they bind to the running loop
+_global_slots = None
+_guild_slots = {}  # guild_id -> [Semaphore, users]; dropped once nobody uses it
+_pool = None
+
+# Resolved stream info, keyed by video ID ('v:youtube:<id>'), normalized
+# search query ('q:<query>') or page URL ('u:<url>')
+url_cache = LRUCache(URL_CACHE_SIZE)
+
+# Flat search results, keyed by (normalized query, max results)
+search_cache = LRUCache(SEARCH_CACHE_SIZE)
+
+# Identical lookups already running, shared instead of repeated
+_in_flight = SingleFlight()
+
+_YOUTUBE_ID = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|live/|embed/)|youtu\.be/)([\w-]{11})'
+)
+_YOUTUBE_HOST = re.compile(r'(?:^|\.)(?:youtube\.com|youtu\.be)$')
+
+
+class ResolverError(Exception):
+    """yt-dlp failed, returned nothing useful or ran past its deadline"""
+
+
+@asynccontextmanager
+async def _slot(guild_id):
+    """Hold a per-guild slot (if any) and a global slot"""
+    global _global_slots
+    if _global_slots is None:
+        _global_slots = asyncio.Semaphore(RESOLVER_CONCURRENCY)
+
+    if guild_id is None:
+        async with _global_slots:
+            yield
+        return
+
+    entry = _guild_slots.get(guild_id)
+    if entry is None:
+        entry = _guild_slots[guild_id] = [asyncio.Semaphore(RESOLVER_GUILD_CONCURRENCY), 0]
+    entry[1] += 1  # Holders and waiters
+    try:
+        # Guild first, so a busy guild queues on its own slots and not the global ones
+        async with entry[0]:
+            async with _global_slots:
+                yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _guild_slots[guild_id]
+
+
+def get_pool():
+    """The warm extractor pool, or None when lookups use the yt-dlp CLI"""
+    global _pool
+    if _pool is None and EXTRACTOR_WORKERS > 0:
+        if not extractor.available():
+            logger.warning("yt_dlp module not importable, falling back to the yt-dlp CLI")
+            return None
+        _pool = extractor.ExtractorPool(EXTRACTOR_WORKERS, EXTRACTOR_MAX_JOBS, EXTRACTOR_MAX_RSS_MB)
+        _pool.start()
+    return _pool
+
+
+def _kill(proc):
+    """Kill a yt-dlp process nobody is waiting for anymore"""
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def _run_cli(args):
+    """Fallback: one yt-dlp process per lookup, returns stdout"""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            'yt-dlp', *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except OSError as e:
+        raise ResolverError(f"Could not start yt-dlp: {e}")
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # Caller went away (timeout, closed HTTP request, ...)
+        _kill(proc)
+        raise
+
+    if proc.returncode != 0:
+        lines = stderr.decode(errors='replace').strip().splitlines()
+        raise ResolverError(lines[-1] if lines else f"yt-dlp exited with {proc.returncode}")
+
+    return stdout.decode(errors='replace')
+
+
+async def _run(kind, target, guild_id):
+    async with _slot(guild_id):
+        pool = get_pool()
+        if pool:
+            try:
+                return await pool.run(kind, target)
+            except ExtractorError as e:
+                raise ResolverError(str(e))
+
+        if kind == 'resolve':
+            output = await _run_cli(['-f', extractor.AUDIO_FORMAT, '--no-playlist', '-J', target])
+            return extractor.summarize(json.loads(output))
+        if kind == 'playlist':
+            target, items = target
+            output = await _run_cli(
+                ['--flat-playlist', '--lazy-playlist', '--playlist-items', items, '-J', target]
+            )
+        else:
+            output = await _run_cli(['--flat-playlist', '-J', target])
+        return json.loads(output).get('entries') or []
+
+
+async def extract(kind, target, guild_id=None, timeout=None):
+    """Run a 'resolve', 'search' or 'playlist' job without blocking the loop.
+
+    Time spent waiting for a slot counts toward the deadline. The job is
+    abandoned (worker or process killed) if the deadline passes or the
+    calling task is cancelled.
+    """
+    timeout = RESOLVER_TIMEOUT if timeout is None else timeout
+    try:
+        with metrics.resolve_seconds.time(kind=kind):
+            return await asyncio.wait_for(_run(kind, target, guild_id), timeout)
+    except asyncio.TimeoutError:
+        metrics.errors_total.inc(stage='resolve')
+        raise ResolverError(f"yt-dlp timed out after {timeout:g}s")
+    except ValueError as e:
+        metrics.errors_total.inc(stage='resolve')
+        raise ResolverError(f"Bad yt-dlp output: {e}")
+    except ResolverError:
+        metrics.errors_total.inc(stage='resolve')
+        raise
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a search query"""
+    return ' '.join(query.lower().split())
+
+
+def cache_key(target):
+    """URL cache key for a page URL or ytsearch1: query"""
+    if target.startswith('ytsearch1:'):
+        return 'q:' + normalize_query(target[len('ytsearch1:'):])
+    match = _YOUTUBE_ID.search(target)
+    if match:
+        return f'v:youtube:{match.group(1)}'
+    return 'u:' + target
+
+
+def playlist_id(url):
+    """The list= of a YouTube playlist or mix URL (None if it isn't one)"""
+    parsed = urlparse(url)
+    if not _YOUTUBE_HOST.search(parsed.hostname or ''):
+        return None
+    values = parse_qs(parsed.query).get('list')
+    return values[0] if values else None
+
+
+def video_id(url):
+    """The video ID in a YouTube URL (None if there isn't one)"""
+    match = _YOUTUBE_ID.search(url)
+    return match.group(1) if match else None
+
+
+def url_expiry(stream_url):
+    """When a resolved URL should stop being reused (time.time())
+
+    googlevideo URLs carry their own expire=<unix time>; anything else
+    gets URL_CACHE_TTL.
+    """
+    parsed = urlparse(stream_url)
+    expire = parse_qs(parsed.query).get('expire')
+    if not expire:
+        # Some googlevideo URLs put it in the path: .../expire/<unix time>/...
+        match = re.search(r'/expire/(\d+)', parsed.path)
+        expire = [match.group(1)] if match else None
+    if expire:
+        try:
+            return float(expire[0]) - URL_CACHE_MARGIN
+        except ValueError:
+            pass
+    return time.time() + URL_CACHE_TTL
+
+
+def lookup(stream_url):
+    """Cached info for a stream URL resolved earlier (None if unknown)"""
+    for _, info in url_cache.items():
+        if info.get('url') == stream_url:
+            return info
+    return None
+
+
+def invalidate(stream_url):
+    """Drop every cache entry pointing at a dead stream URL.
+
+    Returns a page URL to re-resolve from, or None if it wasn't cached.
+    """
+    origin = None
+    for key, info in url_cache.items():
+        if info.get('url') == stream_url:
+            url_cache.pop(key)
+            if info.get('webpage_url'):
+                origin = info['webpage_url']
+            elif info.get('extractor') == 'youtube' and info.get('id'):
+                origin = f"https://www.youtube.com/watch?v={info['id']}"
+    return origin
+
+
+async def resolve(target, guild_id=None, timeout=None):
+    """Resolve a page URL or ytsearch query to stream info (see extractor.summarize)"""
+    key = cache_key(target)
+    info = url_cache.get(key)
+    if info:
+        return info
+
+    return await _in_flight.do(('resolve', key), lambda: _resolve(key, target, guild_id, timeout))
+
+
+async def _resolve(key, target, guild_id, timeout):
+    info = await extract('resolve', target, guild_id, timeout)
+    if info and info.get('url'):
+        expires = url_expiry(info['url'])
+        url_cache.put(key, info, expires)
+        if info.get('id') and info.get('extractor'):
+            # So the same video is found again by URL, by ID or by another query
+            url_cache.put(f"v:{info['extractor']}:{info['id']}", info, expires)
+    return info
+
+
+async def get_url(target, guild_id=None, timeout=None):
+    """Resolve a page URL or ytsearch query to a direct audio URL (None if not found)"""
+    info = await resolve(target, guild_id, timeout)
+    url = (info or {}).get('url') or ''
+    return url if url.startswith('http') else None
+
+
+async def search(query, max_results=10, guild_id=None, timeout=None):
+    """Flat YouTube search, returns yt-dlp's raw entries"""
+    key = (normalize_query(query), max_results)
+    entries = search_cache.get(key)
+    if entries is not None:
+        return entries
+
+    return await _in_flight.do(('search', key), lambda: _search(key, guild_id, timeout))
+
+
+async def _search(key, guild_id, timeout):
+    query, max_results = key
+    entries = await extract('search', f'ytsearch{max_results}:{query}', guild_id, timeout)
+    if entries:
+        search_cache.put(key, entries, time.time() + SEARCH_CACHE_TTL)
+    return entries
+
+
+async def playlist(url, start=1, count=50, guild_id=None, timeout=None):
+    """Flat entries start..start+count-1 (1-based) of a playlist or mix
+
+    Only that page is read, so a huge playlist or an endless mix costs
+    the same as a short one.
+    """
+    return await extract('playlist', (url, f'{start}:{start + count - 1}'), guild_id, timeout)
+
+
+@metrics.collector
+def _collect_metrics():
+    metrics.cache_entries.set(len(url_cache), cache='stream_urls')
+    metrics.cache_entries.set(len(search_cache), cache='search')
+
+
+def cache_stats():
+    """Cache and coalescing counters for /status"""
+    return {
+        'stream_urls': url_cache.stats(),
+        'search': search_cache.stats(),
+        'coalesced_lookups': _in_flight.coalesced,
+        'lookups_in_flight': len(_in_flight),
+    }
@@ -0,0 +1,191 @@
+"""
+OpenClaw Voice - Sessions
+Per-guild voice session: connection, mixer and playback lanes
+"""
+import asyncio
+import logging
+from collections import deque
+
+from .config import VOICE_IDLE_TIMEOUT, DUCK_LEVEL, DUCK_ATTACK_MS, DUCK_RELEASE_MS
+from .mixer import Mixer
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Session states
+IDLE = 'idle'              # Not connected
+CONNECTING = 'connecting'  # Voice handshake in progress
+PLAYING = 'playing'        # Connected, mixer running
+DRAINING = 'draining'      # Connected with nothing to play, until VOICE_IDLE_TIMEOUT
+
+# Each guild has a music lane and a speech lane; speech plays over the music
+LANES = ('music', 'speech')
+
+# Sessions by guild_id
+sessions = {}
+
+# How often playback got a fresh connection vs. reused (or moved) one
+connection_stats = {'connects': 0, 'reuses': 0, 'moves': 0, 'idle_disconnects': 0}
+
+
+class Lane:
+    """What's playing in one lane and what's up next"""
+
+    def __init__(self, name):
+        self.name = name
+        self.current = None
+        self.items = deque()
+        self.replaced = []  # Jumped over by a "now" item, playing until it starts
+        self.lock = asyncio.Lock()
+
+
+class GuildSession:
+    """A guild's voice connection, mixer and lanes
+
+    idle -> connecting -> playing -> draining -> idle (or playing again).
+    State is only touched on the bot loop; code on the audio thread hands
+    its results over with report().
+    """
+
+    def __init__(self, guild_id, loop):
+        self.guild_id = guild_id
+        self.loop = loop
+        self.state = IDLE
+        self.vc = None
+        self.mixer = None
+        self.lanes = {name: Lane(name) for name in LANES}
+        self._connecting = None  # Shared by everyone waiting on the handshake
+        self._idle_timer = None
+
+    def report(self, coro):
+        """Run a coroutine on the bot loop - safe to call from any thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def is_connected(self):
+        return self.vc is not None and self.vc.is_connected()
+
+    def lanes_idle(self):
+        return all(lane.current is None for lane in self.lanes.values())
+
+    async def connect(self, voice_channel):
+        """Voice client in voice_channel, reusing the live connection
+
+        A connection in another channel is moved rather than reconnected,
+        and keeps playing.
+        """
+        self._cancel_idle()
+        if self._connecting is None and self.is_connected():
+            if self.vc.channel.id != voice_channel.id:
+                await self.vc.move_to(voice_channel)
+                connection_stats['moves'] += 1
+            else:
+                connection_stats['reuses'] += 1
+            return self.vc
+
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._connect(voice_channel))
+        else:
+            connection_stats['reuses'] += 1
+        return await asyncio.shield(self._connecting)
+
+    async def _connect(self, voice_channel):
+        if self.vc:
+            await self.close()  # Dropped connection - start over
+        self.state = CONNECTING
+        try:
+            with metrics.connect_seconds.time():
+                self.vc = await voice_channel.connect()
+            connection_stats['connects'] += 1
+            return self.vc
+        except BaseException as e:
+            if isinstance(e, Exception):
+                metrics.errors_total.inc(stage='connect')
+            self.state = IDLE
+            raise
+        finally:
+            self._connecting = None
+
+    def mix(self, source, gain, ducked, after, started=None):
+        """Play a source through the mixer, starting a new mixer if needed"""
+        mixer_input = None
+        if self.mixer and self.vc.is_playing():
+            mixer_input = self.mixer.add(source, gain, ducked, after, started)
+        if mixer_input is None:
+            # The last mixer ran out of inputs (or was stopped)
+            mixer = self.mixer = Mixer(DUCK_LEVEL, DUCK_ATTACK_MS / 1000, DUCK_RELEASE_MS / 1000)
+            mixer_input = mixer.add(source, gain, ducked, after, started)
+            if self.vc.is_playing() or self.vc.is_paused():
+                self.vc.stop()
+            self.vc.play(mixer, after=lambda error: self.report(self._mixer_ended(mixer, error)))
+        self._cancel_idle()
+        self.state = PLAYING
+        return mixer_input
+
+    async def _mixer_ended(self, mixer, error):
+        if error:
+            logger.error(f"Mixer error: {error}")
+        if self.mixer is mixer:
+            self.mixer = None
+
+    def schedule_idle(self):
+        """Disconnect after VOICE_IDLE_TIMEOUT unless the session gets used again"""
+        self._cancel_idle()
+        if not self.is_connected():
+            return
+        self.state = DRAINING
+        self._idle_timer = self.loop.call_later(
+            max(VOICE_IDLE_TIMEOUT, 0),
+            lambda: asyncio.ensure_future(self._idle_disconnect())
+        )
+
+    def _cancel_idle(self):
+        if self._idle_timer:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    async def _idle_disconnect(self):
+        self._idle_timer = None
+        if self.state == DRAINING and self.lanes_idle():
+            connection_stats['idle_disconnects'] += 1
+            await self.disconnect()
+
+    def clear(self):
+        """Drop everything queued after the current items; returns how many"""
+        count = 0
+        for lane in self.lanes.values():
+            count += len(lane.items)
+            for item in lane.items:
+                item.emit('failed', error='Removed from the queue')
+                item.discard()
+            lane.items.clear()
+        return count
+
+    async def close(self):
+        """Drop the voice connection (lanes untouched)"""
+        self._cancel_idle()
+        vc, self.vc = self.vc, None
+        self.mixer = None
+        self.state = IDLE
+        if vc:
+            try:
+                await vc.disconnect()
+            except Exception as e:
+                logger.warning(f"Disconnect error: {e}")
+
+    async def disconnect(self):
+        """Stop playback, clear the lanes and drop the voice connection"""
+        self.clear()
+        for lane in self.lanes.values():
+            if lane.current:
+                lane.current.discard()
+                lane.current = None
+            lane.replaced.clear()
+        await self.close()
+
+
+def get_session(guild_id):
+    """The guild's session, created on first use (call on the bot loop)"""
+    session = sessions.get(guild_id)
+    if session is None:
+        session = sessions[guild_id] = GuildSession(guild_id, asyncio.get_running_loop())
+    return session
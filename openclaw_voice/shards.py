@@ -0,0 +1,170 @@
+"""
+OpenClaw Voice - Shards
+Runs the bot as several worker processes, each owning a range of shards
+
+    python -m openclaw_voice.shards
+
+Each worker is a normal bot process (python -m openclaw_voice.bot) started
+with SHARD_IDS, SHARD_COUNT and its own NOTIFIER_PORT, so it has its own
+gateway connections, voice sessions, ffmpeg processes and API. The front
+API (see front.py) listens on NOTIFIER_PORT and routes to them.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import aiohttp
+
+from .config import BOT_TOKEN, NOTIFIER_PORT, SHARD_COUNT, SHARD_WORKERS, SHARD_WORKER_PORT
+
+logger = logging.getLogger(__name__)
+
+# Discord allows one shard login (IDENTIFY) per 5 seconds per bucket, so
+# workers are started this many seconds apart per shard started before them
+IDENTIFY_INTERVAL = 5.0
+
+# A worker that crashes is restarted after RESTART_DELAY seconds, doubling
+# up to RESTART_DELAY_MAX while it keeps crashing within STABLE_SECONDS
+RESTART_DELAY = 1.0
+RESTART_DELAY_MAX = 60.0
+STABLE_SECONDS = 60.0
+
+
+def shard_for(guild_id, shard_count):
+    """The shard Discord delivers a guild's events to"""
+    return (int(guild_id) >> 22) % shard_count
+
+
+def shard_ranges(shard_count, workers):
+    """Split shards 0..shard_count-1 into contiguous ranges, one per worker"""
+    workers = max(1, min(workers, shard_count))
+    return [
+        list(range(i * shard_count // workers, (i + 1) * shard_count // workers))
+        for i in range(workers)
+    ]
+
+
+async def recommended_shards():
+    """Discord's recommended shard count for this bot token (None if unavailable)"""
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+            async with session.get(
+                'https://discord.com/api/v10/gateway/bot',
+                headers={'Authorization': f'Bot {BOT_TOKEN}'}
+            ) as resp:
+                if resp.status != 200:
+                    logger.warning(f"Could not get recommended shards: HTTP {resp.status}")
+                    return None
+                return (await resp.json()).get('shards')
+    except Exception as e:
+        logger.warning(f"Could not get recommended shards: {e}")
+        return None
+
+
+class Worker:
+    """One bot process running shard_ids, restarted if it dies"""
+
+    def __init__(self, index, shard_ids, shard_count, port):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.port = port
+        self.url = f'http://localhost:{port}'
+        self.restarts = 0
+        self._proc = None
+        self._stopping = False
+
+    @property
+    def running(self):
+        return self._proc is not None and self._proc.returncode is None
+
+    def env(self):
+        return dict(
+            os.environ,
+            SHARD_COUNT=str(self.shard_count),
+            SHARD_IDS=','.join(str(i) for i in self.shard_ids),
+            NOTIFIER_PORT=str(self.port),
+        )
+
+    async def run(self, delay=0):
+        """Start the process after delay seconds, and keep it running"""
+        await asyncio.sleep(delay)
+        backoff = RESTART_DELAY
+        while not self._stopping:
+            started = time.monotonic()
+            self._proc = await asyncio.create_subprocess_exec(
+                sys.executable, '-m', 'openclaw_voice.bot', env=self.env()
+            )
+            logger.info(f"Worker {self.index} (shards {self.shard_ids}) started on port {self.port}")
+            code = await self._proc.wait()
+            if self._stopping:
+                return
+            if time.monotonic() - started > STABLE_SECONDS:
+                backoff = RESTART_DELAY
+            logger.error(f"Worker {self.index} exited with {code}, restarting in {backoff:g}s")
+            self.restarts += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RESTART_DELAY_MAX)
+
+    async def stop(self):
+        self._stopping = True
+        if self.running:
+            self._proc.terminate()
+            try:
+                await asyncio.wait_for(self._proc.wait(), 10)
+            except asyncio.TimeoutError:
+                self._proc.kill()
+
+    def describe(self):
+        return {
+            'worker': self.index,
+            'shards': self.shard_ids,
+            'url': self.url,
+            'running': self.running,
+            'restarts': self.restarts,
+        }
+
+
+async def supervise():
+    """Start the workers and the front API, and run until cancelled"""
+    from . import front
+
+    shard_count = SHARD_COUNT or await recommended_shards() or 1
+    ranges = shard_ranges(shard_count, SHARD_WORKERS or os.cpu_count() or 1)
+    workers = [
+        Worker(index, shard_ids, shard_count, SHARD_WORKER_PORT + index)
+        for index, shard_ids in enumerate(ranges)
+    ]
+    logger.info(f"Running {shard_count} shards in {len(workers)} worker processes")
+
+    runner = await front.start_front(workers, shard_count, NOTIFIER_PORT)
+    tasks = []
+    delay = 0
+    for worker in workers:
+        tasks.append(asyncio.ensure_future(worker.run(delay)))
+        delay += IDENTIFY_INTERVAL * len(worker.shard_ids)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*(worker.stop() for worker in workers), return_exceptions=True)
+        await runner.cleanup()
+
+
+def run():
+    """Run the sharded bot"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not BOT_TOKEN:
+        logger.error("DISCORD_BOT_TOKEN not set in .env")
+        exit(1)
+    try:
+        asyncio.run(supervise())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    run()
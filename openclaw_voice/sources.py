@@ -0,0 +1,120 @@
+"""
+OpenClaw Voice - Audio Sources
+discord.AudioSource implementations used by the player
+"""
+import mmap
+import threading
+from collections import deque
+
+import discord
+from discord.oggparse import OggStream
+
+# discord.py plays 20 ms frames of 48 kHz 16-bit stereo PCM
+FRAME_SIZE = 3840
+FRAME_SECONDS = 0.02
+SILENCE = bytes(FRAME_SIZE)
+
+
+def ffmpeg_failed(source):
+    """Check if the ffmpeg behind a source exited with an error by itself
+
+    Must be called before the source's cleanup(), which drops the process.
+    """
+    process = getattr(getattr(source, 'original', source), '_process', None)
+    if process is None:
+        return False
+    try:
+        return process.wait(timeout=0.5) > 0
+    except Exception:
+        return False  # Still running - we stopped it, it didn't fail
+
+
+class PCMStream(discord.AudioSource):
+    """PCM fed in chunks from the event loop while the audio thread plays it
+
+    If the next chunk isn't ready yet, read() returns silence instead of
+    blocking, so playback timing holds. Playback ends once finish() has
+    been called and everything fed has been played. audible turns True
+    once the first fed audio (not padding) has been read.
+    """
+
+    def __init__(self):
+        self.audible = False
+        self._chunks = deque()
+        self._offset = 0  # Read position within _chunks[0]
+        self._available = 0
+        self._finished = False
+        self._ready = threading.Condition()
+
+    def feed(self, pcm):
+        with self._ready:
+            if pcm and not self._finished:
+                self._chunks.append(pcm)
+                self._available += len(pcm)
+                self._ready.notify()
+
+    def finish(self):
+        """No more audio is coming"""
+        with self._ready:
+            self._finished = True
+            self._ready.notify()
+
+    def _take(self, size):
+        out = bytearray()
+        while len(out) < size and self._chunks:
+            chunk = self._chunks[0]
+            part = chunk[self._offset:self._offset + size - len(out)]
+            out += part
+            self._offset += len(part)
+            if self._offset >= len(chunk):
+                self._chunks.popleft()
+                self._offset = 0
+        self._available -= len(out)
+        self.audible = True
+        return bytes(out)
+
+    def read(self):
+        with self._ready:
+            if self._available < FRAME_SIZE and not self._finished:
+                self._ready.wait(FRAME_SECONDS)
+            if self._available >= FRAME_SIZE:
+                return self._take(FRAME_SIZE)
+            if not self._finished:
+                return SILENCE
+            if self._available:
+                return self._take(self._available).ljust(FRAME_SIZE, b'\0')
+            return b''
+
+    def cleanup(self):
+        with self._ready:
+            self._finished = True
+            self._chunks.clear()
+            self._available = 0
+
+
+class OggOpusFile(discord.AudioSource):
+    """Opus packets read straight from a local Ogg Opus file
+
+    No ffmpeg and no re-encoding: the file is memory-mapped and demuxed
+    here, one 20 ms packet per read(). Stays playable if the file is
+    deleted meanwhile.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._packets = OggStream(self._map).iter_packets()
+
+    def read(self):
+        for packet in self._packets:
+            if not packet.startswith((b'OpusHead', b'OpusTags')):
+                return packet
+        return b''
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if not self._map.closed:
+            self._packets.close()
+            self._map.close()
@@ -0,0 +1,385 @@
+"""
+OpenClaw Voice - TTS
+Speech synthesis, with an on-disk cache of ready-to-play audio
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .config import (
+    TTS_CACHE_DIR, TTS_CACHE_MB, TTS_STREAM_PARALLELISM,
+    TTS_ENGINE, TTS_THREADS, TTS_PROCESSES, TTS_PIPER_MODEL
+)
+from .cache import SingleFlight
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cached audio is stored the way discord.py plays it: raw 48 kHz 16-bit stereo
+# PCM, so a hit goes straight to discord.PCMAudio without ffmpeg
+PCM_ARGS = ['-f', 's16le', '-ar', '48000', '-ac', '2']
+PCM_SUFFIX = '.pcm'
+
+# Sentence boundaries: after . ! ? (and friends) followed by space, or line breaks
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+|\n+')
+
+
+class TTSError(Exception):
+    """Synthesis or audio conversion failed"""
+
+
+class AudioCache:
+    """Content-addressed audio files under a byte budget, evicted LRU-first
+
+    Files are written to a temp name and renamed into place, so readers
+    never see a partial file and concurrent writers of the same entry are
+    harmless. Recency is kept in file mtimes so it survives restarts.
+    Safe to use from several threads, so file I/O can stay off the loop.
+    """
+
+    def __init__(self, directory, max_bytes, suffix=PCM_SUFFIX):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._sizes = None  # name -> bytes, oldest first
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _index(self):
+        with self._lock:
+            if self._sizes is None:
+                os.makedirs(self.directory, exist_ok=True)
+                entries = []
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith(self.suffix):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name, stat.st_size))
+                self._sizes = OrderedDict((name, size) for _, name, size in sorted(entries))
+            return self._sizes
+
+    def get(self, key):
+        """Path of a cached entry (None on a miss), marking it recently used"""
+        sizes = self._index()
+        path = self.path(key)
+        try:
+            os.utime(path)
+            size = os.path.getsize(path)
+        except OSError:
+            with self._lock:
+                sizes.pop(key + self.suffix, None)
+                self.misses += 1
+            return None
+        with self._lock:
+            sizes[key + self.suffix] = size
+            sizes.move_to_end(key + self.suffix)
+            self.hits += 1
+        return path
+
+    def put(self, key, data):
+        """Store data atomically and return its path"""
+        fd, tmp_path = self.temp_file()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return self.adopt(key, tmp_path)
+
+    def temp_file(self):
+        """(fd, path) of a new temp file in the cache directory, for adopt()"""
+        self._index()
+        return tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+    def adopt(self, key, tmp_path):
+        """Move a finished temp file into place as key's entry and return its path"""
+        sizes = self._index()
+        try:
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        size = os.path.getsize(self.path(key))
+        with self._lock:
+            sizes[key + self.suffix] = size
+            sizes.move_to_end(key + self.suffix)
+            self._evict(keep=key + self.suffix)
+        return self.path(key)
+
+    def _evict(self, keep):
+        # Called with _lock held
+        sizes = self._index()
+        total = sum(sizes.values())
+        for name in list(sizes):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            # Anyone still playing the file keeps their open handle
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= sizes.pop(name)
+
+    def stats(self):
+        with self._lock:
+            sizes = dict(self._sizes or {})
+        return {
+            'entries': len(sizes),
+            'bytes': sum(sizes.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+audio_cache = AudioCache(TTS_CACHE_DIR, TTS_CACHE_MB * 2**20)
+_in_flight = SingleFlight()
+
+
+async def to_pcm(data):
+    """Decode audio in any format ffmpeg knows into cache format"""
+    proc = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-loglevel', 'error', '-i', 'pipe:0', *PCM_ARGS, 'pipe:1',
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    metrics.ffmpeg_processes.inc(use='tts')
+    try:
+        pcm, err = await proc.communicate(data)
+    finally:
+        metrics.ffmpeg_processes.dec(use='tts')
+    if proc.returncode != 0:
+        raise TTSError(f"ffmpeg decode failed: {err.decode(errors='replace').strip()[-200:]}")
+    return pcm
+
+
+class TTSEngine:
+    """A speech engine. synthesize() returns audio in any format ffmpeg reads."""
+
+    name = None
+
+    async def synthesize(self, text, lang, voice=None):
+        raise NotImplementedError
+
+
+def _gtts(text, lang, tld):
+    from gtts import gTTS
+    mp3 = io.BytesIO()
+    gTTS(text=text, lang=lang, tld=tld).write_to_fp(mp3)
+    return mp3.getvalue()
+
+
+class GTTSEngine(TTSEngine):
+    """Google Translate TTS (needs network). voice is the accent TLD, e.g. 'co.uk'"""
+
+    name = 'gtts'
+
+    def __init__(self, threads):
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix='gtts')
+
+    async def synthesize(self, text, lang, voice=None):
+        # gTTS does blocking HTTP
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, _gtts, text, lang, voice or 'com')
+
+
+class EspeakEngine(TTSEngine):
+    """Local espeak-ng (offline). voice is an espeak voice name, default is lang"""
+
+    name = 'espeak'
+
+    async def synthesize(self, text, lang, voice=None):
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                'espeak-ng', '--stdout', '-v', voice or lang, '--', text,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except OSError as e:
+            raise TTSError(f"Could not start espeak-ng: {e}")
+        wav, err = await proc.communicate()
+        if proc.returncode != 0:
+            raise TTSError(f"espeak-ng failed: {err.decode(errors='replace').strip()[-200:]}")
+        return wav
+
+
+# One warm piper process per pool worker, so the model is loaded only once
+_piper = None
+
+
+def _piper_synthesize(model, text, speaker):
+    """Runs in a pool worker: synthesize with this worker's piper process"""
+    global _piper
+    if _piper is None or _piper.poll() is not None:
+        _piper = subprocess.Popen(
+            ['piper', '--model', model, '--json-input', '--output_dir', tempfile.gettempdir()],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True
+        )
+
+    fd, wav_path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        request = {'text': text, 'output_file': wav_path}
+        if speaker is not None:
+            request['speaker_id'] = int(speaker)
+        _piper.stdin.write(json.dumps(request) + '\n')
+        _piper.stdin.flush()
+        # piper prints the output path once the file is written
+        if not _piper.stdout.readline():
+            raise RuntimeError("piper exited")
+        with open(wav_path, 'rb') as f:
+            return f.read()
+    finally:
+        os.unlink(wav_path)
+
+
+class PiperEngine(TTSEngine):
+    """Local piper neural TTS (offline), in a process pool. voice is a speaker ID"""
+
+    name = 'piper'
+
+    def __init__(self, model, processes):
+        self.model = model
+        self.processes = processes
+        self._executor = None
+
+    async def synthesize(self, text, lang, voice=None):
+        if not self.model:
+            raise TTSError("TTS_PIPER_MODEL is not set")
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context('spawn')
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, _piper_synthesize, self.model, text, voice
+            )
+        except BrokenProcessPool:
+            self._executor = None  # A worker died; start a fresh pool next time
+            raise TTSError("piper worker pool crashed")
+        except Exception as e:
+            raise TTSError(f"piper failed: {e}")
+
+
+engines = {}
+
+
+def register_engine(engine):
+    """Make an engine selectable by name (config TTS_ENGINE or per request)"""
+    engines[engine.name] = engine
+    return engine
+
+
+def get_engine(name=None):
+    engine = engines.get(name or TTS_ENGINE)
+    if engine is None:
+        raise TTSError(f"Unknown TTS engine: {name or TTS_ENGINE}")
+    return engine
+
+
+register_engine(GTTSEngine(TTS_THREADS))
+register_engine(EspeakEngine())
+register_engine(PiperEngine(TTS_PIPER_MODEL, TTS_PROCESSES))
+
+
+async def _render(key, text, lang, engine, voice):
+    try:
+        with metrics.tts_seconds.time(engine=engine.name):
+            audio = await engine.synthesize(text, lang, voice)
+            pcm = await to_pcm(audio)
+    except Exception:
+        metrics.errors_total.inc(stage='tts')
+        raise
+    # Megabytes of PCM for a long message - written off the loop
+    await asyncio.get_running_loop().run_in_executor(None, audio_cache.put, key, pcm)
+    return pcm
+
+
+def _read_cached(key):
+    """Cached PCM for key (None on a miss)"""
+    path = audio_cache.get(key)
+    if path:
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass  # Evicted in the meantime
+    return None
+
+
+async def synthesize_pcm(text, lang='en', engine=None, voice=None):
+    """Ready-to-play PCM for text - only synthesized on a cache miss"""
+    engine = get_engine(engine)
+    key = AudioCache.key(text, lang, engine.name, voice)
+    # Off the loop: the first lookup scans the cache directory, and a hit
+    # reads the whole file
+    pcm = await asyncio.get_running_loop().run_in_executor(None, _read_cached, key)
+    if pcm is not None:
+        return pcm
+    return await _in_flight.do(key, lambda: _render(key, text, lang, engine, voice))
+
+
+@metrics.collector
+def _collect_metrics():
+    stats = audio_cache.stats()
+    metrics.cache_entries.set(stats['entries'], cache='tts')
+    metrics.cache_bytes.set(stats['bytes'], cache='tts')
+
+
+def split_sentences(text):
+    """Split text into sentences for pipelined synthesis"""
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+async def feed_sentences(stream, sentences, lang='en', engine=None, voice=None):
+    """Synthesize sentences a few at a time, feeding their PCM to stream in order
+
+    Playback can start as soon as the first sentence is ready; a sentence
+    that fails is logged and skipped.
+    """
+    slots = asyncio.Semaphore(TTS_STREAM_PARALLELISM)
+
+    async def render(sentence):
+        async with slots:
+            return await synthesize_pcm(sentence, lang, engine, voice)
+
+    tasks = [asyncio.ensure_future(render(sentence)) for sentence in sentences]
+    try:
+        for sentence, task in zip(sentences, tasks):
+            try:
+                stream.feed(await task)
+            except Exception as e:
+                logger.error(f"TTS failed for '{sentence[:30]}': {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        stream.finish()
@@ -0,0 +1,53 @@
+"""
+OpenClaw Voice - Voice Index
+Who is in which voice channel, kept up to date from gateway events
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceIndex:
+    """user_id -> voice channel, so lookups don't scan every guild's members
+
+    Seeded from the member lists on ready (and when a guild becomes
+    available), then kept current by voice state updates.
+    """
+
+    def __init__(self):
+        self._channels = {}
+
+    def rebuild(self, guilds):
+        self._channels.clear()
+        for guild in guilds:
+            self.add_guild(guild)
+        logger.info(f"Voice index: {len(self._channels)} users in voice")
+
+    def add_guild(self, guild):
+        for channel in guild.voice_channels:
+            for member in channel.members:
+                self._channels[member.id] = channel
+
+    def remove_guild(self, guild_id):
+        for user_id, channel in list(self._channels.items()):
+            if channel.guild.id == guild_id:
+                del self._channels[user_id]
+
+    def update(self, member, before, after):
+        """Apply an on_voice_state_update event"""
+        if after.channel is not None:
+            self._channels[member.id] = after.channel
+            return
+        channel = self._channels.get(member.id)
+        if channel is not None and channel.guild.id == member.guild.id:
+            del self._channels[member.id]
+
+    def get(self, user_id):
+        """The voice channel a user is in (None if not in voice)"""
+        return self._channels.get(user_id)
+
+    def __len__(self):
+        return len(self._channels)
+
+
+voice_index = VoiceIndex()
@@ -0,0 +1,177 @@
+"""
+OpenClaw Voice - Event Loop Watchdog
+Measures event loop lag and catches whatever blocks the loop, with its stack
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from .config import LOOP_WATCHDOG, LOOP_STALL_MS, LOOP_STALL_HISTORY
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) the loop is pinged
+PING_INTERVAL = 0.1
+
+# Frames kept per captured stack, innermost last
+STACK_DEPTH = 25
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+class Stall:
+    """The loop stayed busy past the threshold; stack is from when it crossed it"""
+
+    def __init__(self, started, stack):
+        self.started = started  # time.time()
+        self.seconds = None     # Filled in once the loop answers again
+        self.stack = stack
+
+    @property
+    def where(self):
+        """Innermost frame: the call that was blocking"""
+        return _format_frame(self.stack[-1]) if self.stack else None
+
+    @property
+    def origin(self):
+        """Innermost frame in our own code: what made the blocking call"""
+        for frame in reversed(self.stack):
+            if frame.filename.startswith(_PACKAGE_DIR):
+                return _format_frame(frame)
+        return None
+
+    def describe(self, stack=True):
+        info = {
+            'started': self.started,
+            'ms': round(self.seconds * 1000) if self.seconds is not None else None,
+            'where': self.where,
+            'origin': self.origin,
+        }
+        if stack:
+            info['stack'] = [_format_frame(frame) for frame in self.stack]
+        return info
+
+
+def _format_frame(frame):
+    line = f'{frame.filename}:{frame.lineno} in {frame.name}'
+    return f'{line}: {frame.line}' if frame.line else line
+
+
+class LoopWatchdog:
+    """A thread that pings the event loop and times the answers
+
+    Each ping is a callback scheduled on the loop; the delay before it runs
+    is the loop lag. If it hasn't run after the threshold, the loop thread
+    is stuck in something - its stack is captured right then, so the stall
+    is recorded with the call that caused it.
+    """
+
+    def __init__(self, loop, threshold, history):
+        self.loop = loop
+        self.threshold = threshold
+        self.history = history
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._worst = []  # Longest stalls first
+        self._recent = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loop_thread = None
+        self._thread = None
+
+    def start(self):
+        """Start watching (call from the loop's own thread)"""
+        self._loop_thread = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(PING_INTERVAL):
+            answered = threading.Event()
+            sent = time.monotonic()
+            try:
+                self.loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                return  # Loop closed
+
+            stall = None
+            if not answered.wait(self.threshold):
+                stall = Stall(time.time() - (time.monotonic() - sent), self._loop_stack())
+                while not answered.wait(PING_INTERVAL):
+                    if self._stop.is_set() or self.loop.is_closed():
+                        return
+            self._record(time.monotonic() - sent, stall)
+
+    def _loop_stack(self):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return []
+        return traceback.extract_stack(frame)[-STACK_DEPTH:]
+
+    def _record(self, lag, stall):
+        metrics.loop_lag_seconds.observe(lag)
+        with self._lock:
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if stall is None:
+                return
+            stall.seconds = lag
+            self.stalls += 1
+            self.stalled_seconds += lag
+            self._recent = stall
+            self._worst.append(stall)
+            self._worst.sort(key=lambda s: s.seconds, reverse=True)
+            del self._worst[self.history:]
+        metrics.loop_stalls_total.inc()
+        logger.warning(
+            f"Event loop blocked for {lag * 1000:.0f} ms at {stall.where}"
+            + (f" (from {stall.origin})" if stall.origin and stall.origin != stall.where else '')
+        )
+
+    def stats(self):
+        """Lag and stall counters for /status"""
+        with self._lock:
+            return {
+                'lag_ms': round(self.last_lag * 1000, 1),
+                'max_lag_ms': round(self.max_lag * 1000, 1),
+                'stall_threshold_ms': round(self.threshold * 1000),
+                'stalls': self.stalls,
+                'stalled_seconds': round(self.stalled_seconds, 3),
+                'last_stall': self._recent.describe(stack=False) if self._recent else None,
+            }
+
+    def worst(self):
+        """The longest stalls so far, with stacks"""
+        with self._lock:
+            return [stall.describe() for stall in self._worst]
+
+
+watchdog = None
+
+
+def start():
+    """Start watching the running loop, once (no-op if LOOP_WATCHDOG is off)"""
+    global watchdog
+    if watchdog is None and LOOP_WATCHDOG:
+        watchdog = LoopWatchdog(asyncio.get_running_loop(), LOOP_STALL_MS / 1000, LOOP_STALL_HISTORY)
+        watchdog.start()
+    return watchdog
+
+
+def stats():
+    """Watchdog counters (None when it isn't running)"""
+    return watchdog.stats() if watchdog else None
+
+
+def worst_stalls():
+    return watchdog.worst() if watchdog else []
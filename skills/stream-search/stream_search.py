@@ -3,41 +3,71 @@ OpenClaw Stream Search - Find streams from multiple sources
 """
 import asyncio
 import re
-import subprocess
 import json
 import os
+import sys
+
+try:
+    from openclaw_voice.client import VoiceAPIError, get_client
+except ImportError:
+    # Running from a checkout: the package is two directories up
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from openclaw_voice.client import VoiceAPIError, get_client
 
 # Configuration
 VOICE_API_URL = os.getenv('VOICE_API_URL', 'http://localhost:5000')
 AUTO_PLAY = os.getenv('AUTO_PLAY', 'false').lower() == 'true'
 
+# Seconds to wait for search providers, and for the rest once one has answered
+SEARCH_TIMEOUT = float(os.getenv('SEARCH_TIMEOUT', '10'))
+SEARCH_GRACE = float(os.getenv('SEARCH_GRACE', '1.5'))
+MAX_RESULTS = 8
+
 
 async def check_voice_channel(user_id):
     """Check if user is in a voice channel and return channel info"""
     try:
-        import requests
-        resp = requests.post(
-            f'{VOICE_API_URL}/voice',
-            json={'user_id': user_id},
-            timeout=5
-        )
-        if resp.ok:
-            return resp.json()
-        return {'in_voice': False}
+        return await get_client(VOICE_API_URL).voice(user_id)
     except Exception as e:
         return {'in_voice': False, 'error': str(e)}
 
 
+# Search providers, in the order their results are listed
+PROVIDERS = {}
+
+
+def register_provider(name, search, max_results=5, timeout=None):
+    """Add a source: `await search(query, max_results)` returns result dicts
+    
+    A provider that takes longer than its timeout (default SEARCH_TIMEOUT)
+    is left out of the results.
+    """
+    PROVIDERS[name] = {
+        'search': search,
+        'max_results': max_results,
+        'timeout': timeout or SEARCH_TIMEOUT
+    }
+
+
+async def run_yt_dlp_search(target, timeout=30):
+    """Flat entries for a yt-dlp search target, without blocking the loop"""
+    proc = await asyncio.create_subprocess_exec(
+        'yt-dlp', '--flat-playlist', '-J', target,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    finally:
+        if proc.returncode is None:
+            proc.kill()  # Timed out or cancelled
+            await proc.wait()
+    return json.loads(stdout).get('entries') or []
+
+
 async def search_youtube(query, max_results=5):
     """Search YouTube using yt-dlp"""
     try:
-        result = subprocess.run(
-            ['yt-dlp', '--flat-playlist', '-J', f'ytsearch{max_results}:{query}'],
-            capture_output=True, text=True, timeout=30
-        )
-        
-        data = json.loads(result.stdout)
-        entries = data.get('entries', [])
+        entries = await run_yt_dlp_search(f'ytsearch{max_results}:{query}')
         
         results = []
         for e in entries:
@@ -57,34 +87,19 @@ async def search_youtube(query, max_results=5):
 
 
 async def search_soundcloud(query, max_results=5):
-    """Search SoundCloud"""
+    """Search SoundCloud using yt-dlp's SoundCloud search"""
     try:
-        # Use soundcloud-pc or scrape
-        result = subprocess.run(
-            ['scsearch', query] if os.path.exists('/usr/bin/scsearch') else 
-            ['yt-dlp', '--flat-playlist', '-J', f'ytsearch{max_results}:soundcloud {query}'],
-            capture_output=True, text=True, timeout=30
-        )
-        
-        # Fallback to yt-dlp with soundcloud query
-        result = subprocess.run(
-            ['yt-dlp', '--flat-playlist', '-J', f'ytsearch{max_results}:soundcloud {query}'],
-            capture_output=True, text=True, timeout=30
-        )
-        
-        data = json.loads(result.stdout)
-        entries = data.get('entries', [])
+        entries = await run_yt_dlp_search(f'scsearch{max_results}:{query}')
         
         results = []
         for e in entries:
-            if 'soundcloud' in e.get('url', '').lower():
-                results.append({
-                    'source': 'soundcloud',
-                    'title': e.get('title', 'Unknown'),
-                    'url': e.get('url', e.get('webpage_url', '')),
-                    'duration': e.get('duration', 0),
-                    'thumbnail': e.get('thumbnail', '')
-                })
+            results.append({
+                'source': 'soundcloud',
+                'title': e.get('title', 'Unknown'),
+                'url': e.get('url', e.get('webpage_url', '')),
+                'duration': e.get('duration', 0),
+                'thumbnail': e.get('thumbnail', '')
+            })
         
         return results
         
@@ -92,40 +107,79 @@ async def search_soundcloud(query, max_results=5):
         return []
 
 
+register_provider('youtube', search_youtube, max_results=5)
+register_provider('soundcloud', search_soundcloud, max_results=3)
+
+
 def detect_url(text):
     """Detect if input is already a URL"""
     url_pattern = r'https?://[^\s]+'
     match = re.search(url_pattern, text)
     if match:
-        return match.group(1)
+        return match.group(0)
     return None
 
 
+def dedupe_key(url):
+    """Same key for different URLs of the same track"""
+    match = re.search(r'(?:v=|youtu\.be/|/shorts/)([\w-]{11})', url)
+    if match:
+        return 'youtube:' + match.group(1)
+    return url.split('?')[0].rstrip('/').lower()
+
+
+async def _run_provider(name, query):
+    provider = PROVIDERS[name]
+    return await asyncio.wait_for(
+        provider['search'](query, provider['max_results']), provider['timeout']
+    )
+
+
 async def search_all(query):
-    """Search all sources and combine results"""
+    """Search all sources at once and combine results
+    
+    Once one provider has answered with results, the others get
+    SEARCH_GRACE more seconds; whatever hasn't answered by then (or by
+    SEARCH_TIMEOUT) is left out.
+    """
     # Check if it's already a URL
     url = detect_url(query)
     if url:
         return [{'source': 'direct', 'title': url, 'url': url, 'duration': 0}]
     
-    # Search YouTube
-    yt_results = await search_youtube(query, 5)
-    
-    # Try SoundCloud (fallback to YouTube results)
-    sc_results = await search_soundcloud(query, 3)
-    
-    # Combine, YouTube first
-    all_results = yt_results + sc_results
+    loop = asyncio.get_running_loop()
+    tasks = {asyncio.ensure_future(_run_provider(name, query)): name for name in PROVIDERS}
+    found = {}
+    deadline = loop.time() + SEARCH_TIMEOUT
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(deadline - loop.time(), 0),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break  # Out of time - go with what we have
+            for task in done:
+                if not task.cancelled() and not task.exception():
+                    found[tasks[task]] = task.result()
+            if any(found.values()):
+                deadline = min(deadline, loop.time() + SEARCH_GRACE)
+    finally:
+        for task in pending:
+            task.cancel()
     
-    # Remove duplicates by URL
+    # Combine in provider order, removing duplicates
     seen = set()
     unique = []
-    for r in all_results:
-        if r['url'] not in seen:
-            seen.add(r['url'])
-            unique.append(r)
+    for name in PROVIDERS:
+        for r in found.get(name, []):
+            key = dedupe_key(r['url'])
+            if r['url'] and key not in seen:
+                seen.add(key)
+                unique.append(r)
     
-    return unique[:8]  # Max 8 results
+    return unique[:MAX_RESULTS]
 
 
 async def format_results(results):
@@ -152,23 +206,13 @@ async def format_results(results):
 async def play_stream(url, channel_id=None):
     """Play a stream via Voice API"""
     try:
-        import requests
+        await get_client(VOICE_API_URL).stream(url, channel_id)
+        return "Now playing! 🎵"
         
-        payload = {'url': url}
-        if channel_id:
-            payload['channel_id'] = channel_id
-        
-        resp = requests.post(
-            f'{VOICE_API_URL}/stream',
-            json=payload,
-            timeout=10
-        )
-        
-        if resp.ok:
-            return "Now playing! 🎵"
-        else:
-            return f"Error: {resp.json().get('error', 'Failed to play')}"
-            
+    except VoiceAPIError as e:
+        if e.status:
+            return f"Error: {e}"
+        return f"Error playing stream: {e}"
     except Exception as e:
         return f"Error playing stream: {e}"
 